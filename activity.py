@@ -0,0 +1,84 @@
+"""Отложенная запись времени последнего входа.
+
+Вход в систему только запоминает время в памяти воркера, а фоновый поток
+раз в LAST_LOGIN_FLUSH_INTERVAL секунд (или при накоплении
+LAST_LOGIN_MAX_PENDING пользователей) записывает все накопленные значения
+одним UPDATE. Повторные входы одного пользователя между записями
+схлопываются в одно значение. Оставшееся записывается при остановке воркера.
+"""
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    def __init__(self, writer, interval=5, max_pending=500):
+        self.writer = writer
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, when):
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or previous < when:
+                self._pending[user_id] = when
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """Записывает накопленные значения; возвращает число пользователей."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.writer(batch)
+            except Exception:
+                # Возвращаем значения в буфер, чтобы записать их при следующей попытке
+                with self._lock:
+                    for user_id, when in batch.items():
+                        if self._pending.get(user_id) is None or self._pending[user_id] < when:
+                            self._pending[user_id] = when
+                raise
+            return len(batch)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def _ensure_thread(self):
+        # Поток запускается лениво, уже в процессе воркера gunicorn после fork
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='last-login-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self._safe_flush)
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось записать время последнего входа')
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._safe_flush()
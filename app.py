@@ -1,16 +1,44 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, make_response
+from markupsafe import Markup
 import calendar
 import datetime
+import hashlib
+import json
+import time
+import click
+from sqlalchemy import bindparam, event, insert, select, union_all, update
+from sqlalchemy.orm import Session, object_session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, Message
+from models import db, User, Message, Rotation, UnreadCounter
+from passwords import hasher
+from activity import LastLoginBuffer
+from assets import build_assets, build_version, init_assets
+from cache import LRUCache, UserCache, create_store
+from ics import iter_calendar
+from pubsub import create_broker
+from retention import compact_messages, vacuum
+from sessions import init_sessions, regenerate_session
+from schedule import RotationCache, STATUS_NAMES, NIGHT, parse_pattern
 from config import Config
+from database import init_engines, init_replica, read_from_primary
+from metrics import init_metrics
+from profiler import init_profiler
 from flask_migrate import Migrate
+from itsdangerous import URLSafeSerializer, BadSignature
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 db.init_app(app)
-migrate = Migrate(app, db)
+init_engines(app, db)
+init_replica(app, db)
+metrics = init_metrics(app, db)
+profiles = init_profiler(app)
+assets = init_assets(app)
+version = build_version(app, assets)
+hasher.init_app(app)
+session_interface = init_sessions(app)
+migrate = Migrate(app, db, render_as_batch=True)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -19,14 +47,127 @@ login_manager.login_message = 'Пожалуйста, войдите для до
 login_manager.login_message_category = 'info'
 
 
+user_cache = UserCache(
+    maxsize=app.config['USER_CACHE_SIZE'],
+    ttl=app.config['USER_CACHE_TTL'],
+    shared=create_store(app.config['USER_CACHE_BACKEND'], app.config['USER_CACHE_URL']),
+    shared_ttl=app.config['USER_CACHE_SHARED_TTL']
+)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    data = user_cache.get(user_id)
+    if data is not None:
+        return User.from_cache(data)
+
+    # Кэш общий для воркеров и живет долго, поэтому заполняется только с основной БД
+    with read_from_primary(db.session):
+        user = User.query.get(user_id)
+    if user:
+        user_cache.set(user_id, user.to_cache())
+    return user
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def user_changed(mapper, connection, target):
+    # Сбрасываем кэш после фиксации транзакции, чтобы не закэшировать старую строку заново
+    object_session(target).info.setdefault('stale_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_stale_users(session):
+    for user_id in session.info.pop('stale_users', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_stale_users(session, previous_transaction):
+    session.info.pop('stale_users', None)
+
+
+def load_rotation(rotation_id):
+    rotation = Rotation.query.get(rotation_id)
+    if not rotation:
+        return None
+    return rotation.pattern, rotation.start_date
+
+
+rotations = RotationCache(load_rotation, ttl=app.config['ROTATION_CACHE_TTL'])
+month_fragments = LRUCache(maxsize=app.config['MONTH_FRAGMENT_CACHE_SIZE'])
+broker = create_broker(app.config)
+
+
+@event.listens_for(Rotation, 'after_update')
+@event.listens_for(Rotation, 'after_delete')
+def rotation_changed(mapper, connection, target):
+    rotations.invalidate(target.id)
+    month_fragments.clear()
+
+
+def render_month(schedule, year, month, days, today):
+    # Таблица месяца зависит только от ротации, месяца и текущего дня
+    key = (schedule.key, year, month, today)
+    html = month_fragments.get(key)
+    if html is None:
+        html = Markup(render_template(
+            'month_table.html',
+            month_data={
+                "month": calendar.month_name[month],
+                "year": year,
+                "weeks": calendar.monthcalendar(year, month),
+                "days": days,
+                "today": today.day if (year, month) == (today.year, today.month) else 0
+            },
+            status_names=STATUS_NAMES
+        ))
+        month_fragments.set(key, html)
+    return html
+
+
+def write_last_logins(batch):
+    """Записывает накопленные времена входа одним executemany UPDATE."""
+    table = User.__table__
+    with app.app_context():
+        db.session.execute(
+            update(table).where(
+                (table.c.id == bindparam('b_id')) &
+                ((table.c.last_login.is_(None)) | (table.c.last_login < bindparam('b_last_login')))
+            ).values(last_login=bindparam('b_last_login')),
+            [{'b_id': user_id, 'b_last_login': when} for user_id, when in batch.items()]
+        )
+        db.session.commit()
+    # UPDATE идет мимо событий ORM, поэтому кэш пользователей сбрасываем сами
+    for user_id in batch:
+        user_cache.invalidate(user_id)
+
+
+last_logins = LastLoginBuffer(
+    write_last_logins,
+    interval=app.config['LAST_LOGIN_FLUSH_INTERVAL'],
+    max_pending=app.config['LAST_LOGIN_MAX_PENDING']
+)
+
 
+def reset_caches():
+    rotations.invalidate()
+    month_fragments.clear()
+    user_cache.clear()
+    last_logins.clear()
 
-@app.before_first_request
-def create_tables():
-    db.create_all()
+
+def anonymous_page(template):
+    response = make_response(render_template(template))
+    # Без флеш-сообщений страница одинакова для всех анонимных посетителей,
+    # и nginx может ненадолго ее закэшировать. Показ флеш-сообщений меняет сессию
+    max_age = app.config['ANONYMOUS_CACHE_MAX_AGE']
+    if max_age and not session.modified:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.vary.add('Cookie')
+    return response
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -45,9 +186,15 @@ def login():
             flash('Неверное имя пользователя или пароль', 'danger')
             return render_template('login.html')
 
-        user.last_login = datetime.datetime.utcnow()
-        db.session.commit()
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+
+        # Время входа записывается фоновым потоком, вход остается без записи в БД
+        last_logins.record(user.id, datetime.datetime.utcnow())
 
+        # Новый идентификатор сессии: cookie, выданная до входа, не дает доступа к аккаунту
+        regenerate_session(session)
         login_user(user, remember=remember)
 
         session.permanent = True
@@ -59,7 +206,7 @@ def login():
         flash('Вы успешно вошли в систему!', 'success')
         return redirect(next_page)
 
-    return render_template('login.html')
+    return anonymous_page('login.html')
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -96,21 +243,38 @@ def register():
         flash('Регистрация успешна! Теперь вы можете войти.', 'success')
         return redirect(url_for('login'))
 
-    return render_template('register.html')
+    return anonymous_page('register.html')
 
 
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
+    regenerate_session(session)
     flash('Вы вышли из системы', 'info')
     return redirect(url_for('login'))
 
 
+def calendar_etag(schedule, year, month, today):
+    # Страница календаря меняется только в полночь, при смене ротации или при деплое
+    raw = f'{version}:{current_user.id}:{current_user.username}:{schedule.key}:{year}-{month}:{today.isoformat()}'
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def set_revalidation_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
 @app.route('/')
 @login_required
 def index():
-    start_date = datetime.date(2025, 3, 17)
+    schedule = rotations.get(current_user.rotation_id)
     today = datetime.date.today()
 
     selected_month = request.args.get('month', type=int)
@@ -120,6 +284,14 @@ def index():
         selected_month = today.month
         selected_year = today.year
 
+    # Страницу с флеш-сообщениями всегда отдаем целиком
+    etag = None
+    if '_flashes' not in session:
+        etag = calendar_etag(schedule, selected_year, selected_month, today)
+        last_modified = datetime.datetime.combine(today, datetime.time())
+        if request.if_none_match.contains_weak(etag):
+            return set_revalidation_headers(app.response_class(status=304), etag, last_modified)
+
     current_year = today.year
     years = list(range(current_year - 2, current_year + 5))
     months = [
@@ -128,60 +300,178 @@ def index():
         (9, 'Сентябрь'), (10, 'Октябрь'), (11, 'Ноябрь'), (12, 'Декабрь')
     ]
 
-    calendar_data = []
-
-    for i in range(3):
-        month = (selected_month + i - 1) % 12 + 1
-        year = selected_year + (selected_month + i - 1) // 12
-
-        cal = calendar.monthcalendar(year, month)
-
-        month_data = []
-        for week in cal:
-            week_data = []
-            for day in week:
-                if day == 0:
-                    week_data.append({"day": "", "status": "empty"})
-                else:
-                    current_date = datetime.date(year, month, day)
-                    days_diff = (current_date - start_date).days
-                    cycle_position = days_diff % 4
-
-                    if cycle_position < 2:
-                        status = "work"
-                    else:
-                        status = "off"
-
-                    is_today = (current_date == today)
-
-                    week_data.append({
-                        "day": day,
-                        "status": status,
-                        "today": is_today
-                    })
-            month_data.append(week_data)
-
-        month_name = calendar.month_name[month]
-        calendar_data.append({"month": month_name, "year": year, "weeks": month_data})
+    month_fragments.rollover(today)
+    calendar_months = [
+        render_month(schedule, year, month, days, today)
+        for year, month, days in schedule.months(selected_year, selected_month, 3)
+    ]
 
-    return render_template(
+    response = make_response(render_template(
         'calendar.html',
-        calendar_data=calendar_data,
+        calendar_months=calendar_months,
         selected_month=selected_month,
         selected_year=selected_year,
         months=months,
         years=years,
-        start_date=start_date,
+        start_date=schedule.start_date,
+        has_night=NIGHT in schedule.table,
+        feed_url=url_for('calendar_feed', token=feed_serializer().dumps(current_user.id), _external=True),
         now=datetime.datetime.now(),
         user=current_user
+    ))
+    if etag:
+        set_revalidation_headers(response, etag, last_modified)
+    return response
+
+
+@app.route('/api/schedule')
+@login_required
+def api_schedule():
+    try:
+        first = datetime.date.fromisoformat(request.args.get('from', ''))
+        last = datetime.date.fromisoformat(request.args.get('to', ''))
+    except ValueError:
+        return jsonify({'error': 'Укажите даты from и to в формате ГГГГ-ММ-ДД'}), 400
+
+    days = (last - first).days + 1
+    if days <= 0:
+        return jsonify({'error': 'Дата to раньше даты from'}), 400
+
+    schedule = rotations.get(current_user.rotation_id)
+    result = {
+        'from': first.isoformat(),
+        'to': last.isoformat(),
+        'days': days,
+        'start_date': schedule.start_date.isoformat()
+    }
+
+    if request.args.get('expand', type=int):
+        if days > app.config['SCHEDULE_API_MAX_DAYS']:
+            return jsonify({'error': 'Слишком большой диапазон дат'}), 400
+        result['spans'] = [
+            [start.isoformat(), length, STATUS_NAMES[status]]
+            for start, length, status in schedule.spans(first, last)
+        ]
+    else:
+        # Серии одного периода начиная с from; дальше они повторяются по кругу до to
+        window = first + datetime.timedelta(days=min(days, schedule.period) - 1)
+        result['spans'] = [
+            [length, STATUS_NAMES[status]]
+            for _, length, status in schedule.spans(first, window)
+        ]
+        result['repeat'] = days > schedule.period
+
+    return jsonify(result)
+
+
+def feed_serializer():
+    return URLSafeSerializer(app.config['SECRET_KEY'], salt='calendar-feed')
+
+
+def calendar_feed_response(user):
+    schedule = rotations.get(user.rotation_id)
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=app.config['ICS_PAST_DAYS'])
+    last = today + datetime.timedelta(days=app.config['ICS_FUTURE_DAYS'])
+    name = f'График {user.username}'
+
+    raw = f'{version}:{name}:{schedule.key}:{first.isoformat()}:{last.isoformat()}'
+    etag = hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+    last_modified = datetime.datetime.combine(today, datetime.time())
+    if request.if_none_match.contains_weak(etag):
+        return set_revalidation_headers(app.response_class(status=304), etag, last_modified)
+
+    response = app.response_class(
+        iter_calendar(schedule, first, last, name, today),
+        mimetype='text/calendar'
     )
+    response.headers['Content-Disposition'] = 'inline; filename="calendar.ics"'
+    return set_revalidation_headers(response, etag, last_modified)
+
+
+@app.route('/calendar.ics')
+@login_required
+def calendar_ics():
+    return calendar_feed_response(current_user)
+
+
+@app.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    # Календарные клиенты не передают cookie, поэтому пользователь задается подписанным токеном
+    try:
+        user_id = feed_serializer().loads(token)
+    except BadSignature:
+        return 'Календарь не найден', 404
+
+    user = User.query.get(user_id)
+    if not user:
+        return 'Календарь не найден', 404
+    return calendar_feed_response(user)
+
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    return jsonify({'month_fragments': month_fragments.stats()})
 
 
 @app.route('/chat')
 @login_required
 def chat():
-    users = User.query.filter(User.id != current_user.id).all()
-    return render_template('chat.html', users=users)
+    # Справочник пользователей страница подгружает сама через /api/users
+    return render_template(
+        'chat.html',
+        recent=recent_contacts(current_user.id, app.config['RECENT_CONTACTS_LIMIT']),
+        push=app.config['SSE_ENABLED']
+    )
+
+
+def recent_contacts(user_id, limit):
+    """Недавние собеседники: сначала приславшие непрочитанные МУР, затем те, кому писал пользователь."""
+    unread = UnreadCounter.for_recipient(user_id)
+    last_sent = db.session.query(
+        Message.recipient_id, db.func.max(Message.timestamp).label('last_sent')
+    ).filter(
+        Message.sender_id == user_id, Message.recipient_id != user_id
+    ).group_by(Message.recipient_id).order_by(db.desc('last_sent')).limit(limit)
+
+    ids = sorted(unread, key=unread.get, reverse=True)
+    ids += [row.recipient_id for row in last_sent if row.recipient_id not in unread]
+    ids = ids[:limit]
+    usernames = dict(User.query.with_entities(User.id, User.username).filter(User.id.in_(ids))) if ids else {}
+    return [
+        {'id': contact_id, 'username': usernames[contact_id], 'unread': unread.get(contact_id, 0)}
+        for contact_id in ids if contact_id in usernames
+    ]
+
+
+@app.route('/api/users')
+@login_required
+def api_users():
+    """Поиск пользователей по началу имени с keyset-пагинацией по username."""
+    page_size = app.config['USER_DIRECTORY_PAGE_SIZE']
+    limit = request.args.get('limit', page_size, type=int)
+    if limit < 1:
+        return jsonify({'error': 'Некорректный limit'}), 400
+    limit = min(limit, page_size)
+
+    query = User.query.with_entities(User.id, User.username).filter(User.id != current_user.id)
+    q = request.args.get('q', '').strip()
+    if q:
+        # Диапазон вместо LIKE, чтобы поиск шел по индексу username
+        query = query.filter(User.username >= q, User.username < q + '\U0010ffff')
+    after = request.args.get('after')
+    if after:
+        query = query.filter(User.username > after)
+    users = query.order_by(User.username).limit(limit).all()
+
+    unread = UnreadCounter.for_recipient(current_user.id)
+    return jsonify({
+        'users': [
+            {'id': user.id, 'username': user.username, 'unread': unread.get(user.id, 0)} for user in users
+        ],
+        'next': users[-1].username if len(users) == limit else None
+    })
 
 
 @app.route('/send_mur', methods=['POST'])
@@ -197,27 +487,246 @@ def send_mur():
 
     message = Message(sender_id=current_user.id, recipient_id=recipient.id)
     db.session.add(message)
+    UnreadCounter.increment(current_user.id, [recipient.id])
     db.session.commit()
 
+    timestamp = message.timestamp.strftime('%H:%M:%S')
+    publish_mur(recipient.id, timestamp)
+
     return jsonify({
         'success': True,
         'sender': current_user.username,
-        'timestamp': message.timestamp.strftime('%H:%M:%S')
+        'timestamp': timestamp
+    })
+
+
+@app.route('/send_mur_bulk', methods=['POST'])
+@login_required
+def send_mur_bulk():
+    """Отправляет МУР сразу нескольким получателям одной транзакцией."""
+    raw_ids = request.form.getlist('recipient_ids')
+    if not raw_ids:
+        return jsonify({'error': 'Получатели не выбраны'}), 400
+    if len(raw_ids) > app.config['MUR_BULK_MAX_RECIPIENTS']:
+        return jsonify({'error': 'Слишком много получателей'}), 400
+
+    results = {}
+    recipient_ids = []
+    for raw_id in raw_ids:
+        try:
+            recipient_id = int(raw_id)
+        except ValueError:
+            results[raw_id] = 'invalid'
+            continue
+        if recipient_id not in results:
+            results[recipient_id] = 'not_found'
+            recipient_ids.append(recipient_id)
+
+    # Все получатели проверяются одним запросом, сообщения вставляются одним executemany
+    found = {
+        row.id for row in User.query.with_entities(User.id).filter(User.id.in_(recipient_ids))
+    } if recipient_ids else set()
+    sent = [recipient_id for recipient_id in recipient_ids if recipient_id in found]
+
+    now = datetime.datetime.utcnow()
+    if sent:
+        db.session.execute(insert(Message), [
+            {'sender_id': current_user.id, 'recipient_id': recipient_id, 'timestamp': now}
+            for recipient_id in sent
+        ])
+        UnreadCounter.increment(current_user.id, sent)
+        db.session.commit()
+
+    timestamp = now.strftime('%H:%M:%S')
+    for recipient_id in sent:
+        results[recipient_id] = 'sent'
+        publish_mur(recipient_id, timestamp)
+
+    return jsonify({
+        'success': bool(sent),
+        'sender': current_user.username,
+        'timestamp': timestamp,
+        'sent': len(sent),
+        'results': [{'recipient_id': recipient_id, 'status': status} for recipient_id, status in results.items()]
     })
 
 
+def publish_mur(recipient_id, timestamp):
+    if not app.config['SSE_ENABLED']:
+        return
+    broker.publish(user_channel(recipient_id), {
+        'sender': current_user.username,
+        'sender_id': current_user.id,
+        'timestamp': timestamp
+    })
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+@app.route('/stream')
+@login_required
+def stream():
+    if not app.config['SSE_ENABLED']:
+        # 204 останавливает переподключения EventSource
+        return '', 204
+    subscription = broker.subscribe(user_channel(current_user.id))
+    heartbeat = app.config['SSE_HEARTBEAT']
+    deadline = time.monotonic() + app.config['SSE_MAX_DURATION']
+
+    def events():
+        try:
+            yield 'retry: 1000\n\n'
+            while time.monotonic() < deadline:
+                message = subscription.get(timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+                if message is None:
+                    yield ': ping\n\n'
+                else:
+                    yield f'event: mur\ndata: {json.dumps(message)}\n\n'
+        finally:
+            subscription.close()
+
+    response = app.response_class(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/get_messages/<int:user_id>')
 @login_required
 def get_messages(user_id):
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.recipient_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.recipient_id == current_user.id))
-    ).order_by(Message.timestamp.desc()).limit(50).all()
-
-    return jsonify([{
-        'sender': message.sender.username,
+    page_size = app.config['MESSAGES_PAGE_SIZE']
+    before = request.args.get('before', type=int)
+    if before:
+        cursor = db.session.query(Message.timestamp).filter(Message.id == before).scalar_subquery()
+
+    # OR двух направлений нельзя прочитать из индекса в порядке времени, поэтому
+    # каждое направление берет не больше страницы по ix_message_conversation,
+    # и сортируются только эти 2 * page_size строк, а не вся переписка
+    directions = {(current_user.id, user_id), (user_id, current_user.id)}
+    pages = []
+    for sender_id, recipient_id in sorted(directions):
+        page = select(Message.id, Message.sender_id, Message.timestamp).where(
+            Message.sender_id == sender_id, Message.recipient_id == recipient_id
+        )
+        # Keyset-пагинация: страница раньше сообщения before, без OFFSET.
+        # Условие timestamp <= cursor дает диапазон по индексу, OR его не дает
+        if before:
+            page = page.where(
+                Message.timestamp <= cursor,
+                (Message.timestamp < cursor) | ((Message.timestamp == cursor) & (Message.id < before))
+            )
+        page = page.order_by(Message.timestamp.desc(), Message.id.desc()).limit(page_size).subquery()
+        pages.append(select(page))
+    latest = union_all(*pages).subquery() if len(pages) > 1 else pages[0].subquery()
+
+    # Имя отправителя берем тем же запросом через JOIN, без ленивой загрузки на каждое сообщение
+    messages = db.session.execute(
+        select(latest.c.id, latest.c.timestamp, User.username)
+        .join(User, User.id == latest.c.sender_id)
+        .order_by(latest.c.timestamp.desc(), latest.c.id.desc())
+        .limit(page_size)
+    ).all()
+
+    response = jsonify([{
+        'id': message.id,
+        'sender': message.username,
         'timestamp': message.timestamp.strftime('%H:%M:%S')
     } for message in messages])
+    if len(messages) == page_size:
+        response.headers['X-Next-Before'] = str(messages[-1].id)
+
+    # Открытие переписки отмечает сообщения собеседника прочитанными
+    if not before and UnreadCounter.clear(current_user.id, user_id):
+        db.session.commit()
+    return response
+
+
+@app.route('/mark_read/<int:user_id>', methods=['POST'])
+@login_required
+def mark_read(user_id):
+    """Отмечает прочитанными МУР, пришедшие в уже открытую переписку."""
+    if UnreadCounter.clear(current_user.id, user_id):
+        db.session.commit()
+    return jsonify({'success': True})
+
+
+@app.cli.group()
+def rotation():
+    """Управление ротациями смен."""
+
+
+@rotation.command('create')
+@click.argument('name')
+@click.argument('pattern')
+@click.argument('start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+def create_rotation(name, pattern, start_date):
+    """Создает ротацию, например: flask rotation create crew-a 4/4 2025-03-17"""
+    try:
+        parse_pattern(pattern)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='PATTERN')
+
+    db.session.add(Rotation(name=name, pattern=pattern, start_date=start_date.date()))
+    db.session.commit()
+    click.echo(f'Ротация {name} создана')
+
+
+@rotation.command('assign')
+@click.argument('name')
+@click.argument('usernames', nargs=-1, required=True)
+def assign_rotation(name, usernames):
+    """Назначает ротацию пользователям (бригаде)."""
+    rotation = Rotation.query.filter_by(name=name).first()
+    if not rotation:
+        raise click.BadParameter(f'Ротация {name} не найдена', param_hint='NAME')
+
+    users = User.query.filter(User.username.in_(usernames)).all()
+    for user in users:
+        user.rotation_id = rotation.id
+    db.session.commit()
+    click.echo(f'Ротация {name} назначена пользователям: {len(users)}')
+
+
+@app.cli.group()
+def messages():
+    """Обслуживание таблицы сообщений."""
+
+
+@messages.command('compact')
+@click.option('--days', type=click.IntRange(min=1), default=lambda: app.config['MESSAGE_RETENTION_DAYS'],
+              show_default='MESSAGE_RETENTION_DAYS', help='Сколько дней хранить сообщения целиком.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=lambda: app.config['MESSAGE_COMPACT_BATCH'],
+              show_default='MESSAGE_COMPACT_BATCH', help='Сообщений в одной транзакции.')
+@click.option('--vacuum/--no-vacuum', 'run_vacuum', default=True, help='Выполнить VACUUM/ANALYZE после сжатия.')
+def compact_messages_command(days, batch_size, run_vacuum):
+    """Сворачивает старые сообщения в дневные счетчики, например из cron: flask messages compact --days 90"""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    total = compact_messages(cutoff, batch_size, on_batch=lambda done: click.echo(f'Обработано сообщений: {done}'))
+    click.echo(f'Сжато сообщений старше {days} дн.: {total}')
+    if run_vacuum and total:
+        if vacuum(db.engine):
+            click.echo('VACUUM/ANALYZE выполнен')
+        else:
+            click.echo(f'VACUUM/ANALYZE для {db.engine.dialect.name} не поддерживается')
+
+
+@app.cli.command('sweep-sessions')
+def sweep_sessions():
+    """Удаляет просроченные серверные сессии пачками по SESSION_SWEEP_BATCH."""
+    if session_interface is None:
+        click.echo('Серверные сессии отключены (SESSION_TYPE=null)')
+        return
+    click.echo(f'Удалено сессий: {session_interface.sweep_all()}')
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Минифицирует static/src/ в static/dist/ с хешем в именах файлов."""
+    manifest = build_assets(app.static_folder)
+    for name, built in sorted(manifest.items()):
+        click.echo(f'{name} -> {built}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+"""Статика с хешем содержимого в имени и прогрев шаблонов.
+
+Исходники CSS/JS лежат в static/src/. Команда `flask build-assets`
+минифицирует их и пишет в static/dist/ под именами вида chat.3f2a9c1d.js,
+а соответствие исходных и собранных файлов - в static/dist/manifest.json.
+Имя собранного файла меняется вместе с содержимым, поэтому nginx отдает
+static/dist/ с вечным immutable-кэшированием.
+
+asset_url('js/chat.js') в шаблонах возвращает собранный файл из манифеста,
+а если сборки нет (разработка, тесты) - исходник из static/src/.
+"""
+import hashlib
+import json
+import os
+
+from flask import url_for
+
+SOURCE_DIR = 'src'
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+
+def minify(path, text):
+    try:
+        import rcssmin
+        import rjsmin
+    except ImportError:
+        raise RuntimeError('Для сборки статики установите пакеты rcssmin и rjsmin')
+    if path.endswith('.css'):
+        return rcssmin.cssmin(text)
+    if path.endswith('.js'):
+        return rjsmin.jsmin(text)
+    return text
+
+
+def build_assets(static_folder):
+    """Собирает static/src/ в static/dist/; возвращает манифест."""
+    source_root = os.path.join(static_folder, SOURCE_DIR)
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    manifest = {}
+    for directory, _, files in os.walk(source_root):
+        for filename in sorted(files):
+            source = os.path.join(directory, filename)
+            name = os.path.relpath(source, source_root).replace(os.sep, '/')
+            with open(source, encoding='utf-8') as f:
+                content = minify(name, f.read()).encode('utf-8')
+            digest = hashlib.sha256(content).hexdigest()[:8]
+            base, ext = os.path.splitext(name)
+            built = f'{base}.{digest}{ext}'
+            target = os.path.join(build_root, built)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            manifest[name] = f'{BUILD_DIR}/{built}'
+
+    # Файлы прежних сборок не удаляются: страницы, отданные до обновления,
+    # еще какое-то время ссылаются на них
+    tmp = os.path.join(build_root, f'{MANIFEST}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(build_root, MANIFEST))
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build_version(app, manifest):
+    """Версия сборки: меняется вместе с шаблонами, статикой или APP_VERSION.
+
+    Входит в ETag страниц, чтобы после деплоя браузер получил новую
+    страницу, а не 304 со старой разметкой и ссылками на прежнюю статику.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(app.config['APP_VERSION'].encode())
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    for name in sorted(app.jinja_env.list_templates()):
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+        digest.update(name.encode())
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+def warm_templates(app):
+    """Компилирует все шаблоны заранее, чтобы первый запрос воркера не ждал компиляции."""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def init_assets(app):
+    manifest = load_manifest(app.static_folder)
+
+    def asset_url(name):
+        return url_for('static', filename=manifest.get(name) or f'{SOURCE_DIR}/{name}')
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    if app.config['TEMPLATES_PREWARM']:
+        warm_templates(app)
+    return manifest
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""Нагрузочный тест мур-чата: сколько одновременных пользователей держит один контейнер.
+
+Открывает N потоков /stream (по одному на пользователя), затем во время
+открытых соединений замеряет задержку обычных запросов и доставку МУР
+получателям. Подготовьте базу, запустите сервер в нужном режиме и сравните результаты:
+
+    flask db upgrade
+
+    SERVER_PROFILE=sync SSE_ENABLED=1 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/chat_concurrency.py --url http://localhost:5000 --users 200 --label sync
+
+    SERVER_PROFILE=async GUNICORN_WORKERS=1 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/chat_concurrency.py --url http://localhost:5000 --users 200 --label async
+
+В режиме sync push по умолчанию выключен и /stream отвечает 204, поэтому
+для сравнения он включается явно через SSE_ENABLED=1.
+С PUBSUB_BACKEND=local сообщения доставляются только внутри одного воркера,
+поэтому для замера доставки при нескольких воркерах нужен PUBSUB_BACKEND=redis.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+
+class Client:
+    def __init__(self, url, timeout):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.cookie = ''
+
+    def connection(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, form=None):
+        conn = self.connection()
+        headers = {'Cookie': self.cookie}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie' and value.startswith('session='):
+                self.cookie = value.split(';', 1)[0]
+        conn.close()
+        return response.status, data
+
+    def signup(self, username, password):
+        self.request('POST', '/register', {
+            'username': username,
+            'email': f'{username}@bench.local',
+            'password': password,
+            'confirm_password': password
+        })
+        self.request('POST', '/login', {'username': username, 'password': password})
+
+
+def directory(client, prefix):
+    """Идентификаторы пользователей с заданным началом имени из /api/users."""
+    user_ids = {}
+    after = ''
+    while after is not None:
+        query = urllib.parse.urlencode({'q': prefix, 'after': after})
+        _, data = client.request('GET', f'/api/users?{query}')
+        page = json.loads(data)
+        user_ids.update((user['username'], user['id']) for user in page['users'])
+        after = page['next']
+    return user_ids
+
+
+class Listener(threading.Thread):
+    def __init__(self, client, username, connect_timeout):
+        super().__init__(daemon=True)
+        self.client = client
+        self.username = username
+        self.connect_timeout = connect_timeout
+        self.connected = threading.Event()
+        self.connect_time = None
+        self.received_at = None
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            conn = self.client.connection()
+            conn.request('GET', '/stream', headers={'Cookie': self.client.cookie})
+            response = conn.getresponse()
+            if response.status != 200:
+                return
+            response.fp.readline()
+            self.connect_time = time.perf_counter() - started
+            self.connected.set()
+            while True:
+                line = response.fp.readline()
+                if not line:
+                    return
+                if line.startswith(b'event: mur'):
+                    self.received_at = time.perf_counter()
+                    return
+        except OSError:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=50, help='запросов /get_messages во время нагрузки')
+    parser.add_argument('--connect-timeout', type=float, default=10)
+    parser.add_argument('--label', default='')
+    args = parser.parse_args()
+
+    prefix = uuid.uuid4().hex[:6]
+    password = 'bench-password'
+
+    sender = Client(args.url, args.connect_timeout)
+    sender.signup(f'bench_{prefix}_sender', password)
+
+    listeners = []
+    for i in range(args.users):
+        username = f'bench_{prefix}_{i}'
+        client = Client(args.url, args.connect_timeout)
+        client.signup(username, password)
+        listeners.append(Listener(client, username, args.connect_timeout))
+
+    for listener in listeners:
+        listener.start()
+    deadline = time.monotonic() + args.connect_timeout
+    for listener in listeners:
+        listener.connected.wait(max(deadline - time.monotonic(), 0))
+    connected = [listener for listener in listeners if listener.connected.is_set()]
+
+    user_ids = directory(sender, f'bench_{prefix}_')
+    peer_id = user_ids[listeners[0].username] if listeners else user_ids[f'bench_{prefix}_sender']
+
+    # Задержка обычных запросов, пока открыты соединения чата
+    latencies = []
+    errors = 0
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        try:
+            status, _ = sender.request('GET', f'/get_messages/{peer_id}')
+            if status != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+    # Доставка МУР подключенным получателям
+    delivery = []
+    for listener in connected:
+        started = time.perf_counter()
+        try:
+            sender.request('POST', '/send_mur', {'recipient_id': user_ids[listener.username]})
+        except (OSError, KeyError):
+            continue
+        listener.join(timeout=2)
+        if listener.received_at:
+            delivery.append(listener.received_at - started)
+
+    print(json.dumps({
+        'label': args.label,
+        'users': args.users,
+        'connected': len(connected),
+        'connect_p50_ms': percentile([listener.connect_time for listener in connected], 0.5),
+        'connect_p95_ms': percentile([listener.connect_time for listener in connected], 0.95),
+        'request_errors': errors,
+        'request_p50_ms': percentile(latencies, 0.5),
+        'request_p95_ms': percentile(latencies, 0.95),
+        'delivered': len(delivery),
+        'delivery_p50_ms': percentile(delivery, 0.5),
+        'delivery_p95_ms': percentile(delivery, 0.95)
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Пропускная способность входа в систему и задержка остальных запросов во время всплеска входов.
+
+Сравните настройки хеширования, перезапуская сервер с разными значениями:
+
+    PASSWORD_HASH_WORKERS=0 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/login_throughput.py --url http://localhost:5000 --label inline
+
+    PASSWORD_HASH_WORKERS=2 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/login_throughput.py --url http://localhost:5000 --label pool
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+
+from chat_concurrency import Client, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--label', default='')
+    args = parser.parse_args()
+
+    prefix = uuid.uuid4().hex[:6]
+    password = 'bench-password'
+    usernames = [f'bench_{prefix}_{i}' for i in range(args.users)]
+    for username in usernames:
+        Client(args.url, 30).request('POST', '/register', {
+            'username': username,
+            'email': f'{username}@bench.local',
+            'password': password,
+            'confirm_password': password
+        })
+
+    deadline = time.monotonic() + args.duration
+    logins = []
+    probes = []
+    errors = []
+
+    def login_worker(offset):
+        i = offset
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = Client(args.url, 30).request('POST', '/login', {
+                    'username': usernames[i % len(usernames)],
+                    'password': password
+                })
+            except OSError:
+                errors.append('login')
+                continue
+            if status == 302:
+                logins.append(time.perf_counter() - started)
+            else:
+                errors.append(status)
+            i += 1
+
+    def probe_worker():
+        # Легкий запрос, который не должен ждать за хешированием паролей
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                Client(args.url, 30).request('GET', '/login')
+            except OSError:
+                errors.append('probe')
+                continue
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=login_worker, args=(i,)) for i in range(args.concurrency)]
+    threads.append(threading.Thread(target=probe_worker))
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    print(json.dumps({
+        'label': args.label,
+        'concurrency': args.concurrency,
+        'logins': len(logins),
+        'logins_per_second': round(len(logins) / elapsed, 1),
+        'login_p50_ms': percentile(logins, 0.5),
+        'login_p95_ms': percentile(logins, 0.95),
+        'probe_p50_ms': percentile(probes, 0.5),
+        'probe_p95_ms': percentile(probes, 0.95),
+        'errors': len(errors)
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Сравнение запросов к gunicorn напрямую и через nginx: объем ответа и задержка.
+
+Анонимно запрашивает /login и /register, а от имени вошедшего пользователя
+/chat и /api/users, с Accept-Encoding: gzip и постоянными соединениями,
+как браузер. Для каждого адреса выводит средний размер ответа на проводе,
+p50/p95 и распределение заголовка X-Cache-Status, а в конце итог по каждому
+адресу: на сколько меньше байт и какая доля ответов nginx пришла из микрокэша:
+
+    docker-compose up -d
+    docker-compose exec web python benchmarks/proxy_compare.py \\
+        --direct http://localhost:5000 --proxy http://nginx --requests 500
+
+Оба адреса должны вести к одному приложению с одной базой.
+"""
+import argparse
+import http.client
+import threading
+import time
+import urllib.parse
+import uuid
+
+from chat_concurrency import Client, percentile
+
+ANONYMOUS = ['/login', '/register']
+AUTHENTICATED = ['/chat', '/api/users']
+
+
+def measure(url, path, cookie, requests, concurrency):
+    parsed = urllib.parse.urlparse(url)
+    latencies = []
+    sizes = []
+    cache = {}
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker():
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        headers = {'Accept-Encoding': 'gzip'}
+        if cookie:
+            headers['Cookie'] = cookie
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                # http.client не распаковывает gzip, поэтому это размер тела на проводе
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status >= 400:
+                    errors[0] += 1
+                    continue
+                latencies.append(elapsed)
+                sizes.append(len(body))
+                status = response.getheader('X-Cache-Status') or '-'
+                cache[status] = cache.get(status, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'bytes': round(sum(sizes) / len(sizes)) if sizes else None,
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'cache': cache
+    }
+
+
+def summary(direct, proxied):
+    """Итог по адресу: изменение объема и p50 через nginx и доля попаданий в кэш."""
+    parts = []
+    if direct['bytes'] and proxied['bytes']:
+        parts.append(f"байт {proxied['bytes'] / direct['bytes'] - 1:+.0%}")
+    if direct['p50_ms'] and proxied['p50_ms']:
+        parts.append(f"p50 {proxied['p50_ms'] / direct['p50_ms'] - 1:+.0%}")
+    if proxied['requests']:
+        hits = proxied['cache'].get('HIT', 0) + proxied['cache'].get('STALE', 0) + proxied['cache'].get('UPDATING', 0)
+        parts.append(f"из кэша {hits / proxied['requests']:.0%}")
+    return ', '.join(parts)
+
+
+def login_cookie(url, username, password):
+    client = Client(url, 30)
+    client.request('POST', '/login', {'username': username, 'password': password})
+    return client.cookie
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--direct', default='http://localhost:5000')
+    parser.add_argument('--proxy', default='http://localhost:8088')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    username = f'proxy_{uuid.uuid4().hex[:8]}'
+    password = 'proxy-password'
+    Client(args.direct, 30).signup(username, password)
+    cookies = {
+        'direct': login_cookie(args.direct, username, password),
+        'nginx': login_cookie(args.proxy, username, password)
+    }
+    targets = {'direct': args.direct, 'nginx': args.proxy}
+
+    results = {}
+    print(f"{'путь':<12} {'через':<7} {'байт':>7} {'p50, мс':>8} {'p95, мс':>8} {'rps':>7} {'ошибок':>6}  кэш")
+    for path in ANONYMOUS + AUTHENTICATED:
+        for name, url in targets.items():
+            cookie = cookies[name] if path in AUTHENTICATED else None
+            stats = measure(url, path, cookie, args.requests, args.concurrency)
+            results[path, name] = stats
+            cache = ', '.join(f'{status}={count}' for status, count in sorted(stats['cache'].items()))
+            print(
+                f"{path:<12} {name:<7} {stats['bytes'] or '-':>7} {stats['p50_ms'] or '-':>8} "
+                f"{stats['p95_ms'] or '-':>8} {stats['throughput']:>7} {stats['errors']:>6}  {cache}"
+            )
+
+    print()
+    for path in ANONYMOUS + AUTHENTICATED:
+        print(f'{path:<12} {summary(results[path, "direct"], results[path, "nginx"])}')
+
+
+if __name__ == '__main__':
+    main()
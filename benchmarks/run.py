@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""Нагрузочный тест всех основных страниц с сохранением результатов как базовой линии.
+
+Заполняет локальную базу N пользователями и M сообщениями, запускает gunicorn
+(или использует уже запущенный сервер с той же базой через --url) и
+одновременно нагружает /, /chat, /send_mur, /get_messages/<id> и /login.
+Для каждого маршрута выводит p50/p95/p99, пропускную способность и число
+SQL-запросов на запрос (замеряется в процессе через тестовый клиент Flask).
+
+Результат сохраняется в benchmarks/baselines/ и сравнивается с предыдущим
+запуском:
+
+    python benchmarks/run.py --users 1000 --messages 100000 --label before
+    python benchmarks/run.py --users 1000 --messages 100000 --label after
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from chat_concurrency import Client, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+PASSWORD = 'bench-password'
+
+# Доля каждого маршрута в общей нагрузке
+MIX = {
+    'index': 3,
+    'chat': 2,
+    'send_mur': 2,
+    'get_messages': 3,
+    'login': 1
+}
+
+
+def seed(app, users, messages):
+    """Создает пользователей bench_<i> и случайную переписку между ними."""
+    from sqlalchemy import insert
+    from models import db, Message, User
+    from passwords import hasher
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Один хеш на всех: заполнение не должно упираться в хеширование
+        password_hash = hasher.hash(PASSWORD)
+        db.session.execute(insert(User), [
+            {'username': f'bench_{i}', 'email': f'bench_{i}@bench.local', 'password_hash': password_hash}
+            for i in range(users)
+        ])
+        db.session.commit()
+        user_ids = [row.id for row in User.query.with_entities(User.id).order_by(User.id)]
+
+        now = datetime.datetime.utcnow()
+        rng = random.Random(42)
+        for start in range(0, messages, 10000):
+            rows = []
+            for _ in range(start, min(start + 10000, messages)):
+                sender, recipient = rng.sample(user_ids, 2)
+                rows.append({
+                    'sender_id': sender,
+                    'recipient_id': recipient,
+                    'timestamp': now - datetime.timedelta(seconds=rng.randrange(30 * 86400))
+                })
+            db.session.execute(insert(Message), rows)
+            db.session.commit()
+    return user_ids
+
+
+def route_request(url, client, route, user_ids):
+    if route == 'index':
+        return client.request('GET', '/')
+    if route == 'chat':
+        return client.request('GET', '/chat')
+    if route == 'send_mur':
+        return client.request('POST', '/send_mur', {'recipient_id': random.choice(user_ids)})
+    if route == 'get_messages':
+        return client.request('GET', f'/get_messages/{random.choice(user_ids)}')
+    if route == 'login':
+        return Client(url, client.timeout).request('POST', '/login', {
+            'username': f'bench_{random.randrange(len(user_ids))}',
+            'password': PASSWORD
+        })
+    raise ValueError(route)
+
+
+def count_queries(app, user_ids):
+    """Число SQL-запросов на один запрос каждого маршрута (после прогрева)."""
+    from sqlalchemy import event
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    requests = {
+        'index': lambda c: c.get('/'),
+        'chat': lambda c: c.get('/chat'),
+        'send_mur': lambda c: c.post('/send_mur', data={'recipient_id': user_ids[1]}),
+        'get_messages': lambda c: c.get(f'/get_messages/{user_ids[1]}'),
+        'login': lambda c: app.test_client().post('/login', data={'username': 'bench_1', 'password': PASSWORD})
+    }
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench_0', 'password': PASSWORD})
+    counts = {}
+    for route, send in requests.items():
+        send(client)
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            statements.clear()
+            send(client)
+            counts[route] = len(statements)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return counts
+
+
+def wait_for(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'{url}/login', timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {url} не запустился за {timeout} с')
+
+
+def run_load(url, user_ids, concurrency, duration):
+    clients = []
+    for i in range(concurrency):
+        client = Client(url, 30)
+        client.request('POST', '/login', {'username': f'bench_{i % len(user_ids)}', 'password': PASSWORD})
+        clients.append(client)
+
+    routes = [route for route, weight in MIX.items() for _ in range(weight)]
+    latencies = {route: [] for route in MIX}
+    errors = {route: 0 for route in MIX}
+    deadline = time.monotonic() + duration
+
+    def worker(client, seed_value):
+        rng = random.Random(seed_value)
+        while time.monotonic() < deadline:
+            route = rng.choice(routes)
+            started = time.perf_counter()
+            try:
+                status, _ = route_request(url, client, route, user_ids)
+            except OSError:
+                errors[route] += 1
+                continue
+            if status >= 400:
+                errors[route] += 1
+            else:
+                latencies[route].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(client, i)) for i, client in enumerate(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        route: {
+            'requests': len(latencies[route]),
+            'errors': errors[route],
+            'throughput': round(len(latencies[route]) / elapsed, 1),
+            'p50_ms': percentile(latencies[route], 0.5),
+            'p95_ms': percentile(latencies[route], 0.95),
+            'p99_ms': percentile(latencies[route], 0.99)
+        }
+        for route in MIX
+    }
+
+
+def previous_baseline(exclude=None):
+    # Имена файлов начинаются с времени запуска, поэтому сортировка по имени хронологическая
+    paths = sorted(glob.glob(os.path.join(BASELINES, '*.json')))
+    paths = [path for path in paths if path != exclude]
+    if not paths:
+        return None, None
+    with open(paths[-1], encoding='utf-8') as f:
+        return paths[-1], json.load(f)
+
+
+def compare(current, previous):
+    """Строки сравнения с предыдущим запуском: значение и изменение в процентах."""
+    lines = []
+    for route, stats in current['routes'].items():
+        old = previous['routes'].get(route)
+        if not old:
+            continue
+        parts = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput'):
+            if stats[metric] is None or not old.get(metric):
+                continue
+            change = (stats[metric] - old[metric]) / old[metric] * 100
+            parts.append(f'{metric}={stats[metric]} ({change:+.0f}%)')
+        queries, old_queries = current['queries'].get(route), previous.get('queries', {}).get(route)
+        if queries is not None and old_queries is not None:
+            parts.append(f'queries={queries} ({queries - old_queries:+d})')
+        lines.append(f'{route}: ' + ', '.join(parts))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--database', default=os.path.join('/tmp', 'calendar-bench.db'))
+    parser.add_argument('--url', help='адрес уже запущенного сервера с той же базой (по умолчанию запускается gunicorn)')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--label', default='')
+    parser.add_argument('--no-save', action='store_true', help='не сохранять результат в benchmarks/baselines/')
+    args = parser.parse_args()
+
+    database_url = f'sqlite:///{os.path.abspath(args.database)}'
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, ROOT)
+    from app import app
+
+    user_ids = seed(app, args.users, args.messages)
+    queries = count_queries(app, user_ids)
+
+    server = None
+    url = args.url
+    if not url:
+        url = f'http://127.0.0.1:{args.port}'
+        server = subprocess.Popen(
+            ['gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{args.port}', 'app:app'],
+            cwd=ROOT, env=dict(os.environ, DATABASE_URL=database_url),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    try:
+        wait_for(url, 30)
+        routes = run_load(url, user_ids, args.concurrency, args.duration)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    result = {
+        'label': args.label,
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'users': args.users,
+        'messages': args.messages,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'server_profile': os.environ.get('SERVER_PROFILE', 'sync'),
+        'routes': routes,
+        'queries': queries
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    path = None
+    if not args.no_save:
+        os.makedirs(BASELINES, exist_ok=True)
+        name = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S') + (f'-{args.label}' if args.label else '')
+        path = os.path.join(BASELINES, f'{name}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    previous_path, previous = previous_baseline(exclude=path)
+    if previous:
+        print(f'\nСравнение с {os.path.basename(previous_path)}:')
+        for line in compare(result, previous):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Кэши воркера и общие хранилища для них."""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением размера, TTL и счетчиками."""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tag = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            value, _ = self._data.pop(key, (None, None))
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def rollover(self, tag):
+        """Сбрасывает кэш, если изменилась метка (например, текущая дата)."""
+        if tag != self._tag:
+            with self._lock:
+                if tag != self._tag:
+                    self._data.clear()
+                    self._tag = tag
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class MemoryStore:
+    """Общее хранилище в памяти процесса: заменяет Redis в разработке и тестах."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisStore:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для общего кэша в Redis установите пакет redis')
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.setex(key, ttl, json.dumps(value))
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+
+def create_store(backend, url):
+    if not backend:
+        return None
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'redis':
+        return RedisStore(url)
+    raise ValueError(f'Неизвестный бэкенд кэша: {backend}')
+
+
+class UserCache:
+    """Кэш пользователей для user_loader: локальный LRU воркера и, при
+    наличии, общее хранилище для всех воркеров.
+
+    Значения - словари с полями пользователя (см. User.to_cache).
+    """
+
+    def __init__(self, maxsize, ttl, shared=None, shared_ttl=None):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl or ttl
+
+    @staticmethod
+    def key(user_id):
+        return f'user:{user_id}'
+
+    def get(self, user_id):
+        data = self.local.get(user_id)
+        if data is None and self.shared is not None:
+            data = self.shared.get(self.key(user_id))
+            if data is not None:
+                self.local.set(user_id, data)
+        return data
+
+    def set(self, user_id, data):
+        self.local.set(user_id, data)
+        if self.shared is not None:
+            self.shared.set(self.key(user_id), data, self.shared_ttl)
+
+    def invalidate(self, user_id):
+        self.local.pop(user_id)
+        if self.shared is not None:
+            self.shared.delete(self.key(user_id))
+
+    def clear(self):
+        self.local.clear()
@@ -8,10 +8,126 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Профиль движка БД: sqlite - WAL и PRAGMA, чтобы воркеры не блокировали друг
+    # друга на одном файле; server - пул соединений для PostgreSQL/MySQL;
+    # default - настройки SQLAlchemy по умолчанию
+    DB_PROFILE = os.environ.get('DB_PROFILE') or (
+        'sqlite' if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else 'server'
+    )
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    }
+    ENGINE_PROFILES = {
+        'sqlite': {},
+        'server': {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True
+        },
+        'default': {}
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = ENGINE_PROFILES.get(DB_PROFILE, {})
+
+    # Реплика только для чтения: SELECT из обработчиков идут на нее, запись - на основную БД.
+    # Клиент, записавший данные, REPLICA_READ_YOUR_WRITES секунд читает с основной БД
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL') or None
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    REPLICA_READ_YOUR_WRITES = int(os.environ.get('REPLICA_READ_YOUR_WRITES', 5))
+
+    ROTATION_CACHE_TTL = int(os.environ.get('ROTATION_CACHE_TTL', 300))
+
+    # Кэш пользователей для user_loader: локальный в каждом воркере и, по желанию,
+    # общий (memory - заглушка в процессе, redis - для всех воркеров)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND') or ''
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL') or 'redis://localhost:6379/1'
+    USER_CACHE_SHARED_TTL = int(os.environ.get('USER_CACHE_SHARED_TTL', 3600))
+    MONTH_FRAGMENT_CACHE_SIZE = int(os.environ.get('MONTH_FRAGMENT_CACHE_SIZE', 512))
+    SCHEDULE_API_MAX_DAYS = int(os.environ.get('SCHEDULE_API_MAX_DAYS', 3660))
+    ICS_PAST_DAYS = int(os.environ.get('ICS_PAST_DAYS', 31))
+    ICS_FUTURE_DAYS = int(os.environ.get('ICS_FUTURE_DAYS', 730))
+
+    MESSAGES_PAGE_SIZE = int(os.environ.get('MESSAGES_PAGE_SIZE', 50))
+    # Сообщения старше MESSAGE_RETENTION_DAYS сворачиваются командой flask messages compact
+    MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', 90))
+    MESSAGE_COMPACT_BATCH = int(os.environ.get('MESSAGE_COMPACT_BATCH', 1000))
+    MUR_BULK_MAX_RECIPIENTS = int(os.environ.get('MUR_BULK_MAX_RECIPIENTS', 500))
+    USER_DIRECTORY_PAGE_SIZE = int(os.environ.get('USER_DIRECTORY_PAGE_SIZE', 50))
+    RECENT_CONTACTS_LIMIT = int(os.environ.get('RECENT_CONTACTS_LIMIT', 10))
+    # Сколько секунд nginx может кэшировать /login и /register для анонимных посетителей (0 - не кэшировать)
+    ANONYMOUS_CACHE_MAX_AGE = int(os.environ.get('ANONYMOUS_CACHE_MAX_AGE', 10))
+
+    # local - только внутри процесса; redis - общий канал для всех воркеров
+    PUBSUB_BACKEND = os.environ.get('PUBSUB_BACKEND') or 'local'
+    PUBSUB_URL = os.environ.get('PUBSUB_URL') or 'redis://localhost:6379/0'
+    # Режим сервера: sync - синхронные воркеры gunicorn, async - воркеры gevent,
+    # в которых долгие соединения чата и медленные запросы к БД не занимают воркер целиком
+    SERVER_PROFILE = os.environ.get('SERVER_PROFILE') or 'sync'
+    GUNICORN_WORKERS = int(os.environ.get('GUNICORN_WORKERS', 4))
+    GUNICORN_WORKER_CONNECTIONS = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    GUNICORN_TIMEOUT = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+    # Инструментирование запросов: заголовок Server-Timing, строки JSON в логе
+    # и метрики Prometheus на /metrics (с METRICS_TOKEN - только с этим Bearer-токеном)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+    # Выборочное профилирование: запрос с заголовком X-Profile-Token (или ?_profile=),
+    # равным PROFILER_TOKEN, записывает collapsed stacks в PROFILER_DIR
+    # (по умолчанию instance/profiles), хранятся PROFILER_KEEP последних файлов
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN') or None
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or None
+    PROFILER_KEEP = int(os.environ.get('PROFILER_KEEP', 50))
+    PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))
+    PROFILER_MAX_SECONDS = int(os.environ.get('PROFILER_MAX_SECONDS', 60))
+
+    # Версия приложения (например, хеш коммита) для ETag страниц; шаблоны и статика учитываются и без нее
+    APP_VERSION = os.environ.get('APP_VERSION') or ''
+
+    # Компилировать все шаблоны при запуске воркера, а не при первом запросе
+    TEMPLATES_PREWARM = os.environ.get('TEMPLATES_PREWARM', '1').lower() in ('1', 'true', 'yes')
+
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 10))
+    # Синхронный воркер gunicorn убивается по таймауту, поэтому поток закрывается
+    # раньше, а браузер переподключается сам; в режиме async поток живет дольше
+    SSE_MAX_DURATION = int(os.environ.get('SSE_MAX_DURATION', 300 if SERVER_PROFILE == 'async' else 25))
+    # Открытый поток под sync занимает целый воркер, а брокер local доставляет МУР
+    # только в пределах одного воркера, поэтому по умолчанию push включен лишь
+    # в режиме async с PUBSUB_BACKEND=redis или одним воркером
+    SSE_ENABLED = os.environ.get('SSE_ENABLED', '1' if (
+        SERVER_PROFILE == 'async' and (PUBSUB_BACKEND == 'redis' or GUNICORN_WORKERS == 1)
+    ) else '0').lower() in ('1', 'true', 'yes')
+
+    # Алгоритм и стоимость хеширования паролей; при изменении пароли
+    # перехешируются при следующем входе. Проверка идет в пуле из
+    # PASSWORD_HASH_WORKERS процессов (0 - в потоке запроса). Синхронному воркеру
+    # пул не помогает: он все равно ждет результата, поэтому пул включен только в режиме async
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:260000'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2 if SERVER_PROFILE == 'async' else 0))
+
+    # Время последнего входа копится в памяти и записывается пачкой раз в
+    # LAST_LOGIN_FLUSH_INTERVAL секунд или при накоплении LAST_LOGIN_MAX_PENDING пользователей
+    LAST_LOGIN_FLUSH_INTERVAL = int(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL', 5))
+    LAST_LOGIN_MAX_PENDING = int(os.environ.get('LAST_LOGIN_MAX_PENDING', 500))
+
     PERMANENT_SESSION_LIFETIME = timedelta(days=31)
-    SESSION_TYPE = 'filesystem'
+    # Хранилище сессий: filesystem и sqlalchemy общие для воркеров, memory - только
+    # внутри процесса, null - данные сессии целиком в подписанной cookie
+    SESSION_TYPE = os.environ.get('SESSION_TYPE') or 'filesystem'
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR') or None
     SESSION_PERMANENT = True
     SESSION_USE_SIGNER = True
+    # Просроченные сессии удаляются пачками не чаще раза в SESSION_SWEEP_INTERVAL секунд
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 300))
+    SESSION_SWEEP_BATCH = int(os.environ.get('SESSION_SWEEP_BATCH', 500))
 
     REMEMBER_COOKIE_DURATION = timedelta(days=31)
     REMEMBER_COOKIE_SECURE = False
@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import event
 from app import app, db
 from models import User
 
@@ -43,3 +44,18 @@ def test_client(test_app):
     """Создает тестовый клиент Flask"""
     with test_app.test_client() as client:
         yield client
+
+
+@pytest.fixture(scope='function')
+def query_counter():
+    """Собирает SQL-запросы, выполненные во время теста"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,116 @@
+"""Подключения к БД: профили движка и маршрутизация чтения на реплику.
+
+Параметры пула задаются через SQLALCHEMY_ENGINE_OPTIONS, а PRAGMA SQLite
+действуют только на текущее соединение, поэтому выполняются при открытии
+каждого нового соединения пула.
+
+Если задана реплика (DATABASE_REPLICA_URL), SELECT из обработчиков
+запросов идут на нее, а запись - на основную БД. После первой записи
+сессия до конца запроса читает с основной БД, а клиент, записавший
+данные, еще REPLICA_READ_YOUR_WRITES секунд читает только с основной БД, чтобы
+видеть свои изменения несмотря на отставание реплики.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and self.info.get('use_replica')
+            and not self.info.get('use_primary')
+            and not self._flushing
+            and getattr(clause, 'is_select', False)
+        ):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def route_writes_to_primary(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['use_primary'] = True
+        orm_execute_state.session.info['pending_writes'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def pin_primary_after_flush(db_session, flush_context):
+    db_session.info['use_primary'] = True
+    db_session.info['pending_writes'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_committed_writes(db_session):
+    if db_session.info.pop('pending_writes', False):
+        db_session.info['committed_writes'] = True
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def forget_pending_writes(db_session, previous_transaction):
+    db_session.info.pop('pending_writes', None)
+
+
+@contextmanager
+def read_from_primary(db_session):
+    """Чтения внутри блока идут на основную БД.
+
+    Нужно там, где прочитанное попадает в общий кэш: строка с отстающей
+    реплики, закэшированная сразу после сброса, прожила бы в нем весь TTL.
+    """
+    previous = db_session.info.get('use_primary', False)
+    db_session.info['use_primary'] = True
+    try:
+        yield
+    finally:
+        # Запись внутри блока по-прежнему закрепляет основную БД до конца запроса
+        db_session.info['use_primary'] = previous or 'pending_writes' in db_session.info
+
+
+def sqlite_pragmas_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def init_engines(app, db):
+    profile = app.config['DB_PROFILE']
+    if profile not in app.config['ENGINE_PROFILES']:
+        raise ValueError(f'Неизвестный DB_PROFILE: {profile}')
+    if profile != 'sqlite':
+        return
+
+    listener = sqlite_pragmas_listener(app.config['SQLITE_PRAGMAS'])
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', listener)
+
+
+def init_replica(app, db):
+    """Включает чтение с реплики в обработчиках запросов, если она настроена."""
+    if 'replica' not in app.config['SQLALCHEMY_BINDS']:
+        return
+    window = app.config['REPLICA_READ_YOUR_WRITES']
+
+    @app.before_request
+    def use_replica_for_reads():
+        recent_write = 'read_primary_until' in session and session['read_primary_until'] > time.time()
+        db.session.info['use_replica'] = True
+        db.session.info['use_primary'] = recent_write
+
+    @app.after_request
+    def remember_recent_write(response):
+        if db.session.info.pop('committed_writes', False):
+            session['read_primary_until'] = time.time() + window
+        return response
@@ -0,0 +1,21 @@
+from config import Config
+
+bind = '0.0.0.0:5000'
+workers = Config.GUNICORN_WORKERS
+timeout = Config.GUNICORN_TIMEOUT
+
+if Config.SERVER_PROFILE == 'async':
+    worker_class = 'gevent'
+    worker_connections = Config.GUNICORN_WORKER_CONNECTIONS
+    # Соединения чата открыты долго, keep-alive держим дольше, чем у nginx
+    keepalive = 75
+elif Config.SERVER_PROFILE == 'sync':
+    worker_class = 'sync'
+else:
+    raise ValueError(f'Неизвестный SERVER_PROFILE: {Config.SERVER_PROFILE}')
+
+
+def worker_exit(server, worker):
+    # Дописываем отложенные времена входа перед остановкой воркера
+    from app import last_logins
+    last_logins.flush()
@@ -0,0 +1,75 @@
+"""Экспорт графика смен в iCalendar (RFC 5545)."""
+import datetime
+import hashlib
+
+from schedule import OFF, NIGHT
+
+SUMMARIES = {NIGHT: 'Ночная смена'}
+DEFAULT_SUMMARY = 'Рабочая смена'
+LINE_OCTETS = 75
+
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Строка содержимого с CRLF, сложенная по 75 октетов (RFC 5545, 3.1).
+
+    Продолжение начинается с пробела, а многобайтные символы UTF-8
+    не разрываются.
+    """
+    data = line.encode('utf-8')
+    if len(data) <= LINE_OCTETS:
+        return f'{line}\r\n'
+    parts = []
+    start = 0
+    limit = LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        start = end
+        # Пробел в начале продолжения тоже входит в 75 октетов
+        limit = LINE_OCTETS - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def iter_calendar(schedule, first, last, name, stamp):
+    """Генератор фрагментов .ics: одно событие на каждый рабочий блок.
+
+    stamp - дата для DTSTAMP; при одинаковых аргументах вывод совпадает
+    побайтно, поэтому от него можно считать сильный ETag.
+    """
+    uid_suffix = hashlib.blake2b(schedule.key.encode(), digest_size=6).hexdigest()
+    dtstamp = stamp.strftime('%Y%m%dT000000Z')
+
+    yield (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        'PRODID:-//Bulka//Work schedule calendar//RU\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'METHOD:PUBLISH\r\n'
+        + fold(f'X-WR-CALNAME:{escape(name)}')
+    )
+
+    for start, length, status in schedule.iter_spans(first, last):
+        if status == OFF:
+            continue
+        end = start + datetime.timedelta(days=length)
+        # Первая серия обрезана началом окна, а UID должен оставаться
+        # прежним, пока окно сдвигается, поэтому он считается от начала серии
+        uid = schedule.run_start(start)
+        yield (
+            'BEGIN:VEVENT\r\n'
+            f'UID:{uid:%Y%m%d}-{status}-{uid_suffix}@calendar\r\n'
+            f'DTSTAMP:{dtstamp}\r\n'
+            f'DTSTART;VALUE=DATE:{start:%Y%m%d}\r\n'
+            f'DTEND;VALUE=DATE:{end:%Y%m%d}\r\n'
+            + fold(f'SUMMARY:{SUMMARIES.get(status, DEFAULT_SUMMARY)}') +
+            'TRANSP:OPAQUE\r\n'
+            'END:VEVENT\r\n'
+        )
+
+    yield 'END:VCALENDAR\r\n'
@@ -1,6 +1,6 @@
 import unittest
 import datetime
-from app import app, db
+from app import app, db, last_logins, reset_caches
 from models import User, Message
 import os
 import tempfile
@@ -13,6 +13,7 @@ class IntegrationTestCase(unittest.TestCase):
         app.config['WTF_CSRF_ENABLED'] = False
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.app = app.test_client()
+        reset_caches()
         with app.app_context():
             db.create_all()
             # Создаем тестового пользователя
@@ -22,6 +23,7 @@ class IntegrationTestCase(unittest.TestCase):
             db.session.commit()
 
     def tearDown(self):
+        last_logins.clear()
         with app.app_context():
             db.session.remove()
             db.drop_all()
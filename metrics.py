@@ -0,0 +1,200 @@
+"""Инструментирование запросов (включается METRICS_ENABLED).
+
+Для каждого запроса считаются полное время, число и время SQL-запросов
+(через события движка SQLAlchemy) и время отрисовки шаблонов. Значения
+отдаются в заголовке Server-Timing, пишутся строкой JSON в лог
+calendar.metrics и копятся по эндпоинтам для /metrics в текстовом формате
+Prometheus. Счетчики свои у каждого воркера gunicorn, поэтому в метриках
+есть метка pid.
+
+Если инструментирование выключено, обработчики не регистрируются вовсе.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+
+logger = logging.getLogger('calendar.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'errors', 'duration', 'buckets', 'sql_count', 'sql_time', 'render_time')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, status, duration, sql_count, sql_time, render_time):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            if status >= 500:
+                stats.errors += 1
+            stats.duration += duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+            stats.sql_count += sql_count
+            stats.sql_time += sql_time
+            stats.render_time += render_time
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self):
+        """Текст метрик в формате Prometheus exposition 0.0.4."""
+        pid = os.getpid()
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP app_requests_total Обработанные запросы.',
+                '# TYPE app_requests_total counter'
+            ]
+            lines += [f'app_requests_total{{endpoint="{name}",pid="{pid}"}} {s.requests}' for name, s in endpoints]
+            lines += [
+                '# HELP app_request_errors_total Запросы, завершившиеся ошибкой 5xx.',
+                '# TYPE app_request_errors_total counter'
+            ]
+            lines += [f'app_request_errors_total{{endpoint="{name}",pid="{pid}"}} {s.errors}' for name, s in endpoints]
+            lines += [
+                '# HELP app_request_duration_seconds Время обработки запроса.',
+                '# TYPE app_request_duration_seconds histogram'
+            ]
+            for name, s in endpoints:
+                labels = f'endpoint="{name}",pid="{pid}"'
+                for bound, count in zip(DURATION_BUCKETS, s.buckets):
+                    lines.append(f'app_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'app_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.requests}')
+                lines.append(f'app_request_duration_seconds_sum{{{labels}}} {s.duration:.6f}')
+                lines.append(f'app_request_duration_seconds_count{{{labels}}} {s.requests}')
+            for metric, attr, help_text, fmt in (
+                ('app_sql_queries_total', 'sql_count', 'SQL-запросы.', '{}'),
+                ('app_sql_duration_seconds_total', 'sql_time', 'Время выполнения SQL-запросов.', '{:.6f}'),
+                ('app_template_render_seconds_total', 'render_time', 'Время отрисовки шаблонов.', '{:.6f}')
+            ):
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [
+                    f'{metric}{{endpoint="{name}",pid="{pid}"}} ' + fmt.format(getattr(s, attr))
+                    for name, s in endpoints
+                ]
+        return '\n'.join(lines) + '\n'
+
+
+class TimedTemplate(Template):
+    """Шаблон, который добавляет время своей отрисовки к счетчикам запроса."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if has_app_context() and 'metrics_render_time' in g:
+                g.metrics_render_time += time.perf_counter() - started
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    # Запросы фоновых потоков (например, записи времени входа) к запросу не относятся
+    if has_app_context() and 'metrics_sql_count' in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_time += time.perf_counter() - started
+
+
+def handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_started'):
+        connection.info['metrics_started'].pop()
+
+
+def server_timing(duration, sql_count, sql_time, render_time):
+    return (
+        f'app;dur={duration * 1000:.1f}, '
+        f'db;dur={sql_time * 1000:.1f};desc="{sql_count} queries", '
+        f'tpl;dur={render_time * 1000:.1f}'
+    )
+
+
+def init_metrics(app, db):
+    if not app.config['METRICS_ENABLED']:
+        return None
+
+    metrics = Metrics()
+    app.jinja_env.template_class = TimedTemplate
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_render_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started' not in g:
+            return response
+        duration = time.perf_counter() - g.metrics_started
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe(
+            endpoint, response.status_code, duration,
+            g.metrics_sql_count, g.metrics_sql_time, g.metrics_render_time
+        )
+        response.headers['Server-Timing'] = server_timing(
+            duration, g.metrics_sql_count, g.metrics_sql_time, g.metrics_render_time
+        )
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'sql_count': g.metrics_sql_count,
+            'sql_ms': round(g.metrics_sql_time * 1000, 2),
+            'render_ms': round(g.metrics_render_time * 1000, 2)
+        }, ensure_ascii=False))
+        return response
+
+    token = app.config['METRICS_TOKEN']
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -1,9 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
 from datetime import datetime
+from database import RoutingSession
+from passwords import hasher
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(UserMixin, db.Model):
@@ -13,20 +17,159 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
+    rotation_id = db.Column(db.Integer, db.ForeignKey('rotation.id'), nullable=True)
     messages_sent = db.relationship('Message', backref='sender', lazy='dynamic', foreign_keys='Message.sender_id')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
+
+    # Хеш пароля и email в кэш (в том числе общий Redis) не копируются: на пути
+    # через кэш они не нужны, а при обращении догружаются из БД
+    CACHE_FIELDS = ('id', 'username', 'rotation_id')
+    CACHE_DATETIME_FIELDS = ('created_at', 'last_login')
+
+    def to_cache(self):
+        data = {field: getattr(self, field) for field in self.CACHE_FIELDS}
+        for field in self.CACHE_DATETIME_FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if value else None
+        return data
+
+    @classmethod
+    def from_cache(cls, data):
+        """Восстанавливает пользователя из кэша и привязывает к сессии без запроса к БД."""
+        fields = dict(data)
+        for field in cls.CACHE_DATETIME_FIELDS:
+            if fields[field]:
+                fields[field] = datetime.fromisoformat(fields[field])
+        user = cls(**fields)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+class Rotation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), index=True, unique=True)
+    pattern = db.Column(db.String(64), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    users = db.relationship('User', backref='rotation', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<Rotation {self.name} {self.pattern}>'
+
+
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_conversation', 'sender_id', 'recipient_id', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+
+
+class MessageDailyAggregate(db.Model):
+    """Число МУР в переписке за день для сообщений старше срока хранения."""
+    __tablename__ = 'message_daily_aggregate'
+
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_message_daily_aggregate_sender_id_user'),
+                          primary_key=True)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_message_daily_aggregate_recipient_id_user'),
+                             primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UnreadCounter(db.Model):
+    """Число непрочитанных МУР от sender_id для recipient_id.
+
+    Счетчик ведется при отправке и сбрасывается при просмотре переписки,
+    поэтому значки в чате читаются по первичному ключу без подсчета сообщений.
+    """
+    __tablename__ = 'unread_counter'
+
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_unread_counter_recipient_id_user'),
+                             primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_unread_counter_sender_id_user'),
+                          primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def increment(cls, sender_id, recipient_ids):
+        """Увеличивает счетчики в текущей транзакции одним INSERT ... ON CONFLICT.
+
+        Вставка с обновлением при конфликте атомарна: два одновременных первых
+        МУР одной паре не падают на первичном ключе, а складываются.
+        """
+        rows = [{'recipient_id': recipient_id, 'sender_id': sender_id, 'count': 1} for recipient_id in recipient_ids]
+        if not rows:
+            return
+        dialect = db.session.get_bind(mapper=cls.__mapper__).dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            module = sqlite if dialect == 'sqlite' else postgresql
+            stmt = module.insert(cls.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['recipient_id', 'sender_id'],
+                set_={'count': cls.__table__.c.count + stmt.excluded.count}
+            )
+        elif dialect in ('mysql', 'mariadb'):
+            stmt = mysql.insert(cls.__table__)
+            stmt = stmt.on_duplicate_key_update(count=cls.__table__.c.count + stmt.inserted.count)
+        else:
+            return cls._increment_portable(sender_id, recipient_ids)
+        db.session.execute(stmt, rows)
+
+    @classmethod
+    def _increment_portable(cls, sender_id, recipient_ids):
+        """Для СУБД без upsert: одно UPDATE для существующих пар и одна вставка для новых."""
+        existing = {
+            row.recipient_id for row in cls.query.with_entities(cls.recipient_id).filter(
+                cls.sender_id == sender_id, cls.recipient_id.in_(recipient_ids)
+            )
+        }
+        if existing:
+            db.session.execute(
+                update(cls).where(cls.sender_id == sender_id, cls.recipient_id.in_(existing))
+                .values(count=cls.count + 1)
+                .execution_options(synchronize_session=False)
+            )
+        missing = [recipient_id for recipient_id in recipient_ids if recipient_id not in existing]
+        if missing:
+            db.session.execute(insert(cls), [
+                {'recipient_id': recipient_id, 'sender_id': sender_id, 'count': 1} for recipient_id in missing
+            ])
+
+    @classmethod
+    def clear(cls, recipient_id, sender_id):
+        """Сбрасывает счетчик; если непрочитанных нет, строка не перезаписывается."""
+        return db.session.execute(
+            update(cls).where(cls.recipient_id == recipient_id, cls.sender_id == sender_id, cls.count > 0)
+            .values(count=0)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    @classmethod
+    def for_recipient(cls, recipient_id):
+        return dict(
+            cls.query.with_entities(cls.sender_id, cls.count)
+            .filter(cls.recipient_id == recipient_id, cls.count > 0)
+        )
+
+
+class ServerSession(db.Model):
+    """Данные серверной сессии (SESSION_TYPE=sqlalchemy)."""
+    __tablename__ = 'server_session'
+
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expiry = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,62 @@
+"""Хеширование паролей.
+
+Алгоритм и стоимость берутся из Config (PASSWORD_HASH_METHOD). Хеширование
+и проверка выполняются в ограниченном пуле процессов, чтобы всплеск входов
+в начале смены не занимал CPU воркеров, обслуживающих остальные запросы.
+"""
+import atexit
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+def normalize_method(method):
+    """Метод в том виде, в каком он записывается в хеш (с числом итераций)."""
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256', salt_length=16, workers=0):
+        self.configure(method, salt_length, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def configure(self, method, salt_length, workers):
+        self.method = normalize_method(method)
+        self.salt_length = salt_length
+        self.workers = workers
+
+    def init_app(self, app):
+        self.configure(
+            app.config['PASSWORD_HASH_METHOD'],
+            app.config['PASSWORD_SALT_LENGTH'],
+            app.config['PASSWORD_HASH_WORKERS']
+        )
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        # Пул создается лениво, уже в процессе воркера gunicorn после fork
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    atexit.register(self._pool.shutdown)
+        return self._pool.submit(func, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return not pwhash or pwhash.split('$', 1)[0] != self.method
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,165 @@
+"""Выборочное профилирование отдельных запросов (включается PROFILER_ENABLED).
+
+Профилируется только запрос с заголовком X-Profile-Token или параметром
+?_profile=, равным PROFILER_TOKEN. Пока он обрабатывается, отдельный поток
+раз в PROFILER_INTERVAL секунд снимает стек потока запроса. Результат
+записывается в PROFILER_DIR в формате collapsed stacks (одна строка
+"кадр;кадр;кадр число" на стек), который понимают flamegraph.pl и speedscope.
+В каталоге хранятся только PROFILER_KEEP последних файлов, старые удаляются.
+Имя файла возвращается в заголовке X-Profile.
+
+Если профилирование выключено, обработчики не регистрируются вовсе.
+"""
+import datetime
+import hmac
+import os
+import sys
+from collections import Counter
+
+from flask import g, request
+
+try:
+    from gevent.monkey import get_original
+except ImportError:
+    get_original = None
+
+
+def _original(module, name):
+    # В воркере gevent потоки подменены гринлетами, а выборка должна идти
+    # из настоящего потока, иначе она не получит управления, пока запрос занят CPU.
+    # Все гринлеты воркера живут в одном потоке, поэтому в профиль попадает
+    # и то, что выполнялось в соседних гринлетах
+    if get_original is not None:
+        return get_original(module, name)
+    return getattr(__import__(module), name)
+
+
+start_new_thread = _original('_thread', 'start_new_thread')
+allocate_lock = _original('_thread', 'allocate_lock')
+get_ident = _original('_thread', 'get_ident')
+sleep = _original('time', 'sleep')
+monotonic = _original('time', 'monotonic')
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """Стек кадра от корня к вершине в виде строки collapsed stacks."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Снимает стек одного потока из отдельного потока до вызова stop()."""
+
+    def __init__(self, thread_id, interval, max_duration):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks = Counter()
+        self._running = False
+        self._done = allocate_lock()
+
+    def start(self):
+        self._running = True
+        self._done.acquire()
+        start_new_thread(self._run, ())
+
+    def stop(self):
+        """Останавливает выборку и возвращает собранные стеки."""
+        self._running = False
+        # Дожидаемся последней выборки, чтобы не читать счетчик одновременно с ней
+        self._done.acquire()
+        self._done.release()
+        return self.stacks
+
+    def _run(self):
+        deadline = monotonic() + self.max_duration
+        try:
+            while self._running and monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+                del frame
+                sleep(self.interval)
+        finally:
+            self._done.release()
+
+
+class ProfileStore:
+    """Кольцевой буфер файлов профилей: хранит не больше keep последних."""
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.folded'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def save(self, endpoint, stacks):
+        # Имя начинается с времени записи, поэтому сортировка по имени хронологическая
+        name = '{}-{}-{}.folded'.format(
+            datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f'), os.getpid(), endpoint
+        )
+        path = os.path.join(self.directory, name)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f'{stack} {count}\n')
+        os.replace(tmp, path)
+        for old in self.paths()[:-self.keep]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+        return name
+
+
+def requested(token):
+    supplied = request.headers.get('X-Profile-Token') or request.args.get('_profile')
+    return bool(supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def init_profiler(app):
+    if not app.config['PROFILER_ENABLED']:
+        return None
+    token = app.config['PROFILER_TOKEN']
+    if not token:
+        raise ValueError('Для PROFILER_ENABLED нужен PROFILER_TOKEN')
+
+    store = ProfileStore(
+        app.config['PROFILER_DIR'] or os.path.join(app.instance_path, 'profiles'),
+        app.config['PROFILER_KEEP']
+    )
+    interval = app.config['PROFILER_INTERVAL']
+    max_duration = app.config['PROFILER_MAX_SECONDS']
+
+    @app.before_request
+    def start_profiling():
+        if requested(token):
+            g.profiler = StackSampler(get_ident(), interval, max_duration)
+            g.profiler.start()
+
+    @app.after_request
+    def save_profile(response):
+        sampler = g.pop('profiler', None)
+        if sampler is not None:
+            name = store.save(request.endpoint or 'unknown', sampler.stop())
+            response.headers['X-Profile'] = name
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exception):
+        # Если after_request не дошел до профилировщика, выборку все равно надо остановить
+        sampler = g.pop('profiler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    return store
@@ -0,0 +1,97 @@
+"""Pub/sub для доставки новых сообщений подключенным клиентам.
+
+LocalBroker работает внутри одного процесса и подходит для разработки и
+тестов. Чтобы сообщения доходили до клиентов, подключенных к другим
+воркерам gunicorn, используется RedisBroker (нужен пакет redis).
+"""
+import json
+import queue
+import threading
+from collections import defaultdict
+
+
+class LocalSubscription:
+    def __init__(self, broker, channel, maxsize):
+        self._broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = LocalSubscription(self, channel, self.maxsize)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Медленный клиент не должен блокировать отправителя
+                pass
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout=None):
+        message = self._pubsub.get_message(timeout=timeout)
+        if not message:
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self._pubsub.close()
+
+
+class RedisBroker:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для PUBSUB_BACKEND=redis установите пакет redis')
+        self._redis = redis.Redis.from_url(url)
+
+    def subscribe(self, channel):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        return RedisSubscription(pubsub)
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, json.dumps(message))
+
+
+def create_broker(config):
+    backend = config['PUBSUB_BACKEND']
+    if backend == 'local':
+        return LocalBroker()
+    if backend == 'redis':
+        return RedisBroker(config['PUBSUB_URL'])
+    raise ValueError(f'Неизвестный PUBSUB_BACKEND: {backend}')
@@ -0,0 +1,89 @@
+"""Сжатие старых сообщений.
+
+Сообщения старше срока хранения сворачиваются в дневные счетчики по
+переписке (MessageDailyAggregate), а сами строки удаляются пачками: каждая
+пачка - отдельная короткая транзакция, чтобы не блокировать отправку МУР.
+"""
+from collections import Counter
+
+from sqlalchemy import bindparam, delete, insert, update
+
+from models import db, Message, MessageDailyAggregate
+
+
+def compact_batch(cutoff, batch_size):
+    """Сворачивает до batch_size самых старых сообщений раньше cutoff; возвращает их число."""
+    rows = db.session.query(
+        Message.id, Message.sender_id, Message.recipient_id, Message.timestamp
+    ).filter(Message.timestamp < cutoff).order_by(Message.timestamp, Message.id).limit(batch_size).all()
+    if not rows:
+        return 0
+
+    counts = Counter((row.sender_id, row.recipient_id, row.timestamp.date()) for row in rows)
+    days = [day for _, _, day in counts]
+    existing = {
+        (row.sender_id, row.recipient_id, row.day)
+        for row in MessageDailyAggregate.query.with_entities(
+            MessageDailyAggregate.sender_id, MessageDailyAggregate.recipient_id, MessageDailyAggregate.day
+        ).filter(
+            MessageDailyAggregate.sender_id.in_({sender_id for sender_id, _, _ in counts}),
+            MessageDailyAggregate.day.between(min(days), max(days))
+        )
+    }
+
+    table = MessageDailyAggregate.__table__
+    updates = [
+        {'b_sender_id': sender_id, 'b_recipient_id': recipient_id, 'b_day': day, 'b_count': count}
+        for (sender_id, recipient_id, day), count in counts.items() if (sender_id, recipient_id, day) in existing
+    ]
+    if updates:
+        db.session.execute(
+            update(table).where(
+                (table.c.sender_id == bindparam('b_sender_id')) &
+                (table.c.recipient_id == bindparam('b_recipient_id')) &
+                (table.c.day == bindparam('b_day'))
+            ).values(count=table.c.count + bindparam('b_count')),
+            updates
+        )
+    inserts = [
+        {'sender_id': sender_id, 'recipient_id': recipient_id, 'day': day, 'count': count}
+        for (sender_id, recipient_id, day), count in counts.items() if (sender_id, recipient_id, day) not in existing
+    ]
+    if inserts:
+        db.session.execute(insert(table), inserts)
+
+    db.session.execute(delete(Message.__table__).where(Message.id.in_([row.id for row in rows])))
+    db.session.commit()
+    return len(rows)
+
+
+def compact_messages(cutoff, batch_size, on_batch=None):
+    """Сворачивает все сообщения раньше cutoff пачками; возвращает общее число."""
+    total = 0
+    while True:
+        compacted = compact_batch(cutoff, batch_size)
+        total += compacted
+        if on_batch and compacted:
+            on_batch(total)
+        if compacted < batch_size:
+            return total
+
+
+def vacuum(engine):
+    """Возвращает место и обновляет статистику планировщика там, где это поддерживается.
+
+    VACUUM нельзя выполнять внутри транзакции, поэтому используется
+    отдельное соединение в режиме autocommit. Возвращает False, если
+    СУБД не поддерживается.
+    """
+    statements = {
+        'sqlite': ['VACUUM', 'ANALYZE'],
+        'postgresql': ['VACUUM ANALYZE message', 'VACUUM ANALYZE message_daily_aggregate'],
+        'mysql': ['OPTIMIZE TABLE message', 'ANALYZE TABLE message_daily_aggregate']
+    }.get(engine.dialect.name)
+    if not statements:
+        return False
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return True
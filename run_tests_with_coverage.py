@@ -7,7 +7,11 @@ import os
 # Настройка покрытия кода
 cov = coverage.Coverage(
     branch=True,
-    include=['app.py', 'models.py', 'config.py'],
+    include=[
+        'app.py', 'models.py', 'config.py', 'schedule.py', 'cache.py', 'ics.py', 'pubsub.py', 'passwords.py',
+        'sessions.py', 'retention.py', 'database.py', 'activity.py', 'metrics.py',
+        'profiler.py', 'assets.py'
+    ],
     omit=['tests.py', 'test_*.py', 'integration_tests.py', 'functional_tests.py', 'run_tests*.py']
 )
 
@@ -15,7 +19,12 @@ cov = coverage.Coverage(
 cov.start()
 
 # Импорт тестов
-from tests import AuthTestCase, CalendarTestCase, MessageTestCase, ModelTestCase
+from tests import (
+    AuthTestCase, PasswordTestCase, LastLoginTestCase, CalendarTestCase, ScheduleTestCase, RotationTestCase,
+    FragmentCacheTestCase, ScheduleApiTestCase, CalendarFeedTestCase, MessageTestCase, RetentionTestCase,
+    UserDirectoryTestCase, UserCacheTestCase, SessionTestCase, EngineTestCase, ReplicaTestCase, PushTestCase,
+    MetricsTestCase, ProfilerTestCase, AssetsTestCase, ModelTestCase
+)
 from integration_tests import IntegrationTestCase
 
 
@@ -26,8 +35,25 @@ def run_tests_with_coverage():
 
     # Добавляем тесты в набор
     suite.addTests(loader.loadTestsFromTestCase(AuthTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(PasswordTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(LastLoginTestCase))
     suite.addTests(loader.loadTestsFromTestCase(CalendarTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ScheduleTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(RotationTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(FragmentCacheTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ScheduleApiTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(CalendarFeedTestCase))
     suite.addTests(loader.loadTestsFromTestCase(MessageTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(RetentionTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(UserDirectoryTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(UserCacheTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(SessionTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(EngineTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ReplicaTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(PushTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(MetricsTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ProfilerTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(AssetsTestCase))
     suite.addTests(loader.loadTestsFromTestCase(ModelTestCase))
     suite.addTests(loader.loadTestsFromTestCase(IntegrationTestCase))
 
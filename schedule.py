@@ -0,0 +1,184 @@
+"""Движок графика смен.
+
+Статус каждого дня цикла хранится одним байтом, поэтому статусы за любой
+диапазон дат получаются одной операцией над байтовой строкой (повтор
+периода и срез), без построения объектов на каждый день.
+"""
+import calendar
+import datetime
+import functools
+import re
+import time
+
+OFF = 0
+WORK = 1
+NIGHT = 2
+
+STATUS_NAMES = ('off', 'work', 'night')
+
+PATTERN_CODES = {'W': WORK, 'D': WORK, 'N': NIGHT, 'O': OFF, 'X': OFF, '-': OFF}
+COUNTS_RE = re.compile(r'^\d+(/\d+)+$')
+
+DEFAULT_START_DATE = datetime.date(2025, 3, 17)
+DEFAULT_CYCLE = bytes((WORK, WORK, OFF, OFF))
+
+
+class Schedule:
+    __slots__ = ('start_date', 'table', 'period', 'key', 'run_lengths')
+
+    def __init__(self, start_date, table):
+        if not table:
+            raise ValueError('Цикл графика не может быть пустым')
+        self.start_date = start_date
+        self.table = bytes(table)
+        self.period = len(self.table)
+        self.key = f'{start_date.isoformat()}/{self.table.hex()}'
+        self.run_lengths = run_lengths(self.table)
+
+    def offset(self, date):
+        return (date - self.start_date).days % self.period
+
+    def status(self, date):
+        return self.table[self.offset(date)]
+
+    def range(self, first, last):
+        """Статусы дней с first по last включительно, по байту на день."""
+        length = (last - first).days + 1
+        if length <= 0:
+            return b''
+        offset = self.offset(first)
+        repeats = (offset + length) // self.period + 1
+        return (self.table * repeats)[offset:offset + length]
+
+    def iter_spans(self, first, last):
+        """Серии одинаковых статусов (start, days, status) с first по last.
+
+        Длины серий посчитаны заранее на период, поэтому каждая серия
+        получается за константное время независимо от ее длины.
+        """
+        remaining = (last - first).days + 1
+        position = self.offset(first)
+        day = first
+        while remaining > 0:
+            length = remaining
+            if self.run_lengths:
+                length = min(self.run_lengths[position], remaining)
+            yield day, length, self.table[position]
+            day += datetime.timedelta(days=length)
+            remaining -= length
+            position = (position + length) % self.period
+
+    def run_start(self, date):
+        """Первый день серии, в которую входит date; для однородного цикла,
+        где серия не кончается, - начало цикла."""
+        if self.run_lengths is None:
+            return self.start_date
+        position = self.offset(date)
+        back = 0
+        while self.table[(position - back - 1) % self.period] == self.table[position]:
+            back += 1
+        return date - datetime.timedelta(days=back)
+
+    def spans(self, first, last):
+        return list(self.iter_spans(first, last))
+
+    def month(self, year, month):
+        days = calendar.monthrange(year, month)[1]
+        return self.range(datetime.date(year, month, 1), datetime.date(year, month, days))
+
+    def months(self, year, month, count):
+        """Статусы count месяцев подряд одним проходом: [(year, month, bytes), ...]."""
+        bounds = []
+        for i in range(count):
+            m = (month + i - 1) % 12 + 1
+            y = year + (month + i - 1) // 12
+            bounds.append((y, m, calendar.monthrange(y, m)[1]))
+        first_year, first_month, _ = bounds[0]
+        last_year, last_month, last_days = bounds[-1]
+        statuses = self.range(
+            datetime.date(first_year, first_month, 1),
+            datetime.date(last_year, last_month, last_days)
+        )
+
+        result = []
+        position = 0
+        for y, m, days in bounds:
+            result.append((y, m, statuses[position:position + days]))
+            position += days
+        return result
+
+
+def run_lengths(table):
+    """Для каждого дня периода - сколько дней подряд (с переходом через
+    конец периода) держится его статус; None для однородного цикла."""
+    period = len(table)
+    if table.count(table[0]) == period:
+        return None
+
+    lengths = []
+    for position in range(period):
+        length = 1
+        while table[(position + length) % period] == table[position]:
+            length += 1
+        lengths.append(length)
+    return tuple(lengths)
+
+
+def parse_pattern(pattern):
+    """Разбирает строку ротации в таблицу статусов на период.
+
+    Поддерживаются две формы: счетчики "2/2", "4/4", "5/2" (рабочие и
+    выходные дни по очереди) и посуточная запись "DNOO", где D/W - дневная
+    смена, N - ночная, O/X/- - выходной.
+    """
+    pattern = pattern.replace(' ', '').upper()
+    if COUNTS_RE.match(pattern):
+        table = bytearray()
+        for i, count in enumerate(pattern.split('/')):
+            table.extend((OFF if i % 2 else WORK,) * int(count))
+        if table:
+            return bytes(table)
+    elif pattern and all(char in PATTERN_CODES for char in pattern):
+        return bytes(PATTERN_CODES[char] for char in pattern)
+    raise ValueError(f'Некорректный шаблон ротации: {pattern!r}')
+
+
+@functools.lru_cache(maxsize=256)
+def compile_rotation(pattern, start_date):
+    return Schedule(start_date, parse_pattern(pattern))
+
+
+class RotationCache:
+    """Кэш скомпилированных ротаций воркера: rotation_id -> Schedule.
+
+    loader(rotation_id) возвращает (pattern, start_date) или None. Записи
+    живут ttl секунд, чтобы изменения из других воркеров тоже подхватывались.
+    """
+
+    def __init__(self, loader, ttl=300):
+        self._loader = loader
+        self._ttl = ttl
+        self._entries = {}
+
+    def get(self, rotation_id):
+        if rotation_id is None:
+            return DEFAULT_SCHEDULE
+
+        now = time.monotonic()
+        entry = self._entries.get(rotation_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        row = self._loader(rotation_id)
+        schedule = compile_rotation(*row) if row else DEFAULT_SCHEDULE
+        self._entries[rotation_id] = (schedule, now + self._ttl)
+        return schedule
+
+    def invalidate(self, rotation_id=None):
+        if rotation_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(rotation_id, None)
+
+
+DEFAULT_SCHEDULE = Schedule(DEFAULT_START_DATE, DEFAULT_CYCLE)
@@ -0,0 +1,302 @@
+"""Серверное хранилище сессий.
+
+В cookie остается только подписанный идентификатор сессии, а данные
+(состояние входа, flash-сообщения) лежат в хранилище, общем для всех
+воркеров gunicorn. Бэкенд выбирается SESSION_TYPE:
+
+    null        - стандартные подписанные cookie Flask
+    memory      - словарь в процессе (разработка и тесты)
+    filesystem  - файл на сессию в SESSION_FILE_DIR, общий для воркеров одного хоста
+    sqlalchemy  - таблица server_session в основной БД
+
+Данные записываются только при изменении сессии, а срок хранения
+продлевается не чаще раза в половину PERMANENT_SESSION_LIFETIME.
+Просроченные сессии удаляются пачками по SESSION_SWEEP_BATCH не чаще
+раза в SESSION_SWEEP_INTERVAL секунд.
+"""
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, insert, select, update
+
+from models import db, ServerSession as ServerSessionRow
+
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Выдает сессии новый идентификатор; запись под старым удаляется при сохранении."""
+        if not self.new and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+def regenerate_session(session):
+    """Защита от фиксации сессии: вызывается при входе и выходе.
+
+    Подписанная cookie Flask (SESSION_TYPE=null) и так меняется вместе
+    с содержимым, а серверной сессии нужен новый идентификатор.
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+class MemorySessionStore:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        return self._data.get(sid)
+
+    def save(self, sid, data, expires):
+        with self._lock:
+            self._data[sid] = (data, expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def sweep(self, now, limit):
+        with self._lock:
+            expired = [sid for sid, (_, expires) in self._data.items() if expires <= now][:limit]
+            for sid in expired:
+                self._data.pop(sid, None)
+        return len(expired)
+
+
+class FileSystemSessionStore:
+    """Файл на сессию; срок хранения записан во время изменения файла."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        # Имя файла не зависит от присланного клиентом значения напрямую
+        return os.path.join(self.directory, hashlib.sha256(sid.encode()).hexdigest())
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = f.read()
+            expires = os.stat(path).st_mtime
+        except OSError:
+            return None
+        return data, datetime.utcfromtimestamp(expires)
+
+    def save(self, sid, data, expires):
+        path = self._path(sid)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            timestamp = (expires - datetime(1970, 1, 1)).total_seconds()
+            os.utime(tmp_path, (timestamp, timestamp))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def delete(self, sid):
+        try:
+            os.unlink(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now, limit):
+        deadline = (now - datetime(1970, 1, 1)).total_seconds()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if removed >= limit:
+                    break
+                try:
+                    if entry.stat().st_mtime <= deadline:
+                        os.unlink(entry.path)
+                        removed += 1
+                except OSError:
+                    # Файл уже удалил другой воркер
+                    continue
+        return removed
+
+
+class SQLAlchemySessionStore:
+    """Сессии в таблице server_session.
+
+    Запросы идут через отдельное соединение, а не через db.session, чтобы
+    сохранение сессии не фиксировало незавершенную транзакцию обработчика.
+    """
+
+    table = ServerSessionRow.__table__
+
+    def load(self, sid):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.data, self.table.c.expiry).where(self.table.c.id == sid)
+            ).first()
+        return tuple(row) if row else None
+
+    def save(self, sid, data, expires):
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(self.table).where(self.table.c.id == sid).values(data=data, expiry=expires)
+            )
+            if not result.rowcount:
+                conn.execute(insert(self.table).values(id=sid, data=data, expiry=expires))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == sid))
+
+    def sweep(self, now, limit):
+        # Одна пачка по индексу expiry, чтобы не держать блокировку на всей таблице
+        expired = select(self.table.c.id).where(self.table.c.expiry <= now).limit(limit)
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(self.table).where(self.table.c.id.in_(expired.scalar_subquery())))
+        return result.rowcount
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, use_signer=True, sweep_interval=300, sweep_batch=500):
+        self.store = store
+        self.use_signer = use_signer
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._sweep_lock = threading.Lock()
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt='server-session', key_derivation='hmac')
+
+    def open_session(self, app, request):
+        value = request.cookies.get(self.get_cookie_name(app))
+        sid = None
+        if value and self.use_signer:
+            try:
+                sid = self.get_signer(app).unsign(value).decode()
+            except BadSignature:
+                sid = None
+        elif value:
+            sid = value
+
+        if sid:
+            stored = self.store.load(sid)
+            if stored is not None:
+                data, expires = stored
+                if expires > datetime.utcnow():
+                    return ServerSession(self.serializer.loads(data), sid=sid, expires=expires)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+                )
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        if session.modified or session.expires is None or session.expires - now < lifetime / 2:
+            session.expires = now + lifetime
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), session.expires)
+            self.maybe_sweep(now)
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        value = session.sid
+        if self.use_signer:
+            value = self.get_signer(app).sign(value).decode()
+        response.set_cookie(
+            name,
+            value,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite
+        )
+
+    def maybe_sweep(self, now):
+        if time.monotonic() < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            self.store.sweep(now, self.sweep_batch)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep_all(self):
+        """Удаляет все просроченные сессии пачками; возвращает их число."""
+        now = datetime.utcnow()
+        total = 0
+        while True:
+            removed = self.store.sweep(now, self.sweep_batch)
+            total += removed
+            if removed < self.sweep_batch:
+                return total
+
+
+def create_session_store(app):
+    backend = app.config['SESSION_TYPE']
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'filesystem':
+        directory = app.config['SESSION_FILE_DIR'] or os.path.join(app.instance_path, 'sessions')
+        return FileSystemSessionStore(directory)
+    if backend == 'sqlalchemy':
+        return SQLAlchemySessionStore()
+    raise ValueError(f'Неизвестный SESSION_TYPE: {backend}')
+
+
+def init_sessions(app):
+    """Подключает серверные сессии; при SESSION_TYPE=null остаются cookie Flask."""
+    if app.config['SESSION_TYPE'] == 'null':
+        return None
+    interface = ServerSessionInterface(
+        create_session_store(app),
+        use_signer=app.config['SESSION_USE_SIGNER'],
+        sweep_interval=app.config['SESSION_SWEEP_INTERVAL'],
+        sweep_batch=app.config['SESSION_SWEEP_BATCH']
+    )
+    app.session_interface = interface
+    return interface
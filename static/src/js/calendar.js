@@ -0,0 +1,44 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Кнопка "Предыдущий месяц"
+    document.getElementById('prev-month').addEventListener('click', function() {
+        let month = parseInt(document.getElementById('month').value);
+        let year = parseInt(document.getElementById('year').value);
+
+        month--;
+        if (month < 1) {
+            month = 12;
+            year--;
+        }
+
+        document.getElementById('month').value = month;
+        document.getElementById('year').value = year;
+        document.getElementById('date-form').submit();
+    });
+
+    // Кнопка "Следующий месяц"
+    document.getElementById('next-month').addEventListener('click', function() {
+        let month = parseInt(document.getElementById('month').value);
+        let year = parseInt(document.getElementById('year').value);
+
+        month++;
+        if (month > 12) {
+            month = 1;
+            year++;
+        }
+
+        document.getElementById('month').value = month;
+        document.getElementById('year').value = year;
+        document.getElementById('date-form').submit();
+    });
+
+    // Кнопка "Перейти к текущему месяцу"
+    document.getElementById('today-button').addEventListener('click', function() {
+        const today = new Date();
+        const currentMonth = today.getMonth() + 1; // JavaScript месяцы начинаются с 0
+        const currentYear = today.getFullYear();
+
+        document.getElementById('month').value = currentMonth;
+        document.getElementById('year').value = currentYear;
+        document.getElementById('date-form').submit();
+    });
+});
@@ -0,0 +1,182 @@
+document.addEventListener('DOMContentLoaded', function() {
+    let selectedUserId = null;
+    const chatBox = document.getElementById('chatBox');
+    const sendMurBtn = document.getElementById('sendMur');
+    const loadOlderBtn = document.getElementById('loadOlder');
+    let nextBefore = null;
+    const recentList = document.getElementById('recentList');
+    const userList = document.getElementById('userList');
+    const userSearch = document.getElementById('userSearch');
+    const loadMoreUsersBtn = document.getElementById('loadMoreUsers');
+    let nextUser = null;
+    let searchTimer = null;
+
+    function renderUser(user) {
+        const item = document.createElement('div');
+        item.className = 'user-item';
+        item.dataset.userId = user.id;
+        item.dataset.username = user.username;
+        item.textContent = user.username + ' ';
+        const badge = document.createElement('span');
+        badge.className = 'badge bg-danger rounded-pill float-end unread-badge';
+        badge.textContent = user.unread || 0;
+        badge.classList.toggle('d-none', !user.unread);
+        item.appendChild(badge);
+        item.classList.toggle('active', String(user.id) === selectedUserId);
+        return item;
+    }
+
+    function userItems(userId) {
+        return document.querySelectorAll(`.user-item[data-user-id="${userId}"]`);
+    }
+
+    // Справочник грузится страницами по мере надобности, а не целиком
+    function loadUsers(after) {
+        const params = new URLSearchParams({q: userSearch.value.trim()});
+        if (after) {
+            params.set('after', after);
+        }
+        fetch(`/api/users?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!after) {
+                    userList.innerHTML = '';
+                }
+                data.users.forEach(user => userList.appendChild(renderUser(user)));
+                nextUser = data.next;
+                loadMoreUsersBtn.classList.toggle('d-none', !nextUser);
+            });
+    }
+
+    userSearch.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => loadUsers(), 200);
+    });
+
+    loadMoreUsersBtn.addEventListener('click', function() {
+        if (nextUser) {
+            loadUsers(nextUser);
+        }
+    });
+
+    loadUsers();
+
+    function renderMessage(message) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message';
+        messageDiv.innerHTML = `
+            <div class="sender">${message.sender}</div>
+            <div>мур</div>
+            <div class="time">${message.timestamp}</div>
+        `;
+        return messageDiv;
+    }
+
+    function loadMessages(userId, before) {
+        const url = before ? `/get_messages/${userId}?before=${before}` : `/get_messages/${userId}`;
+        fetch(url)
+            .then(response => {
+                nextBefore = response.headers.get('X-Next-Before');
+                loadOlderBtn.classList.toggle('d-none', !nextBefore);
+                return response.json();
+            })
+            .then(messages => {
+                if (!before) {
+                    chatBox.innerHTML = '';
+                }
+                messages.forEach(message => {
+                    chatBox.appendChild(renderMessage(message));
+                });
+                if (!before) {
+                    chatBox.scrollTop = chatBox.scrollHeight;
+                }
+            });
+    }
+
+    loadOlderBtn.addEventListener('click', function() {
+        if (selectedUserId && nextBefore) {
+            loadMessages(selectedUserId, nextBefore);
+        }
+    });
+
+    // Новые сообщения приходят с сервера через SSE, без повторных запросов.
+    // Без push (SSE_ENABLED) они видны при открытии переписки
+    function onMur(event) {
+        const message = JSON.parse(event.data);
+        if (String(message.sender_id) === selectedUserId) {
+            chatBox.prepend(renderMessage(message));
+            fetch(`/mark_read/${selectedUserId}`, {method: 'POST'});
+            return;
+        }
+        if (!recentList.querySelector(`.user-item[data-user-id="${message.sender_id}"]`)) {
+            recentList.prepend(renderUser({id: message.sender_id, username: message.sender}));
+        }
+        userItems(message.sender_id).forEach(item => {
+            item.classList.add('has-new');
+            const badge = item.querySelector('.unread-badge');
+            badge.textContent = Number(badge.textContent) + 1;
+            badge.classList.remove('d-none');
+        });
+    }
+
+    if (document.querySelector('.chat-container').dataset.push === '1') {
+        new EventSource('/stream').addEventListener('mur', onMur);
+    }
+
+    document.querySelector('.user-list').addEventListener('click', function(event) {
+        const item = event.target.closest('.user-item');
+        if (!item) return;
+        document.querySelectorAll('.user-item.active').forEach(i => i.classList.remove('active'));
+        selectedUserId = item.dataset.userId;
+        userItems(selectedUserId).forEach(i => {
+            i.classList.add('active');
+            i.classList.remove('has-new');
+            const badge = i.querySelector('.unread-badge');
+            badge.textContent = '0';
+            badge.classList.add('d-none');
+        });
+        sendMurBtn.disabled = false;
+        loadMessages(selectedUserId);
+    });
+
+    sendMurBtn.addEventListener('click', function() {
+        if (!selectedUserId) return;
+
+        const formData = new FormData();
+        formData.append('recipient_id', selectedUserId);
+
+        fetch('/send_mur', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                chatBox.prepend(renderMessage(data));
+            }
+        });
+    });
+
+    document.getElementById('sendMurAll').addEventListener('click', function() {
+        const listed = userList.querySelectorAll('.user-item');
+        if (!listed.length || !confirm(`Отправить МУР всем в списке (${listed.length})?`)) return;
+
+        const formData = new FormData();
+        listed.forEach(item => formData.append('recipient_ids', item.dataset.userId));
+
+        fetch('/send_mur_bulk', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => response.json())
+        .then(data => {
+            // Открытая переписка могла не попасть в список получателей
+            const sentToSelected = data.results.some(
+                result => String(result.recipient_id) === selectedUserId && result.status === 'sent'
+            );
+            if (sentToSelected) {
+                chatBox.prepend(renderMessage(data));
+            }
+        });
+    });
+});
@@ -1,6 +1,6 @@
 import pytest
 import datetime
-from app import app, db
+from app import app, db, last_logins, reset_caches
 from models import User, Message
 from flask import url_for
 
@@ -10,11 +10,13 @@ def client():
     app.config['TESTING'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['WTF_CSRF_ENABLED'] = False
+    reset_caches()
 
     with app.test_client() as client:
         with app.app_context():
             db.create_all()
             yield client
+            last_logins.clear()
             db.session.remove()
             db.drop_all()
 
@@ -145,6 +147,30 @@ class TestMessage:
             ).first()
             assert message is not None
 
+    def test_get_messages_query_count(self, logged_in_client, query_counter):
+        """Тест отсутствия N+1 запросов при загрузке переписки"""
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first()
+            user2 = User(username='testuser2', email='test2@example.com')
+            user2.set_password('password123')
+            db.session.add(user2)
+            db.session.commit()
+            for i in range(30):
+                sender, recipient = (user1.id, user2.id) if i % 2 else (user2.id, user1.id)
+                db.session.add(Message(sender_id=sender, recipient_id=recipient))
+            db.session.commit()
+            user2_id = user2.id
+
+        # Клиент держит общий контекст приложения: очищаем identity map, как в новом запросе
+        db.session.expunge_all()
+        query_counter.clear()
+        response = logged_in_client.get(f'/get_messages/{user2_id}')
+
+        assert len(response.get_json()) == 30
+        # Пользователь сессии берется из кэша: остается запрос страницы вместе с именами отправителей
+        # и сброс счетчика непрочитанных
+        assert len(query_counter) == 2
+
 
 class TestModels:
     def test_user_model(self, client):
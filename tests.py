@@ -1,10 +1,45 @@
 import unittest
 import datetime
-from app import app, db
-from models import User, Message
-from flask import url_for
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from app import app, db, broker, last_logins, profiles, user_cache, reset_caches, session_interface
+from activity import LastLoginBuffer
+from assets import build_assets, build_version, init_assets
+from models import User, Message, MessageDailyAggregate, Rotation, UnreadCounter
+from retention import compact_messages
+from cache import LRUCache
+from ics import iter_calendar
+from pubsub import LocalBroker
+from passwords import PasswordHasher, hasher
+from sessions import MemorySessionStore, SQLAlchemySessionStore, ServerSessionInterface
+from schedule import Schedule, RotationCache, DEFAULT_SCHEDULE, WORK, OFF, NIGHT, parse_pattern
+from flask import Flask, render_template_string, url_for
+from config import Config
+from database import init_engines, init_replica, read_from_primary
+from metrics import init_metrics
+from profiler import init_profiler
+import json
 import os
+import shutil
 import tempfile
+import time
+
+
+@contextmanager
+def count_queries():
+    """Собирает SQL-запросы, выполненные внутри блока"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
 
 
 class BaseTestCase(unittest.TestCase):
@@ -14,11 +49,14 @@ class BaseTestCase(unittest.TestCase):
         app.config['WTF_CSRF_ENABLED'] = False
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         self.app = app.test_client()
+        reset_caches()
         with app.app_context():
             db.create_all()
             self.create_test_users()
 
     def tearDown(self):
+        # Отложенные времена входа не должны записываться в базу следующего теста
+        last_logins.clear()
         with app.app_context():
             db.session.remove()
             db.drop_all()
@@ -97,6 +135,118 @@ class AuthTestCase(BaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'\xd0\x92\xd1\x8b \xd0\xb2\xd1\x8b\xd1\x88\xd0\xbb\xd0\xb8 \xd0\xb8\xd0\xb7 \xd1\x81\xd0\xb8\xd1\x81\xd1\x82\xd0\xb5\xd0\xbc\xd1\x8b', response.data)  # 'Вы вышли из системы' в UTF-8
 
+    def test_anonymous_page_cache_headers(self):
+        """Тест Cache-Control для анонимных страниц входа и регистрации"""
+        for path in ('/login', '/register'):
+            response = self.app.get(path)
+            self.assertTrue(response.cache_control.public)
+            self.assertEqual(response.cache_control.max_age, app.config['ANONYMOUS_CACHE_MAX_AGE'])
+            self.assertIn('Cookie', response.vary)
+            self.assertNotIn('Set-Cookie', response.headers)
+
+        # Страница с флеш-сообщением индивидуальна и не кэшируется
+        self.app.post('/login', data={'username': 'testuser', 'password': 'password123'})
+        response = self.app.get('/logout', follow_redirects=True)
+        self.assertFalse(response.cache_control.public)
+        self.assertIsNone(response.cache_control.max_age)
+
+        # Неудачная попытка входа тоже показывает флеш-сообщение
+        response = self.app.post('/login', data={'username': 'testuser', 'password': 'wrong'})
+        self.assertFalse(response.cache_control.public)
+
+
+class PasswordTestCase(BaseTestCase):
+    def test_hasher_policy(self):
+        """Тест алгоритма хеширования из настроек и проверки в пуле процессов"""
+        pooled = PasswordHasher('pbkdf2:sha256:1000', workers=1)
+        inline = PasswordHasher('pbkdf2:sha256:1000')
+        pwhash = pooled.hash('secret')
+        self.assertTrue(pwhash.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(pooled.verify(pwhash, 'secret'))
+        self.assertTrue(inline.verify(pwhash, 'secret'))
+        self.assertFalse(pooled.verify(pwhash, 'wrong'))
+        self.assertFalse(inline.needs_rehash(pwhash))
+        self.assertTrue(PasswordHasher('pbkdf2:sha256').needs_rehash(pwhash))
+
+    def test_pool_only_for_async(self):
+        """Тест пула хеширования по умолчанию только в режиме async"""
+        self.assertEqual(Config.SERVER_PROFILE, 'sync')
+        self.assertEqual(Config.PASSWORD_HASH_WORKERS, 0)
+        self.assertEqual(hasher.workers, 0)
+
+    def test_rehash_on_login(self):
+        """Тест перехеширования пароля при входе после смены параметров"""
+        method = hasher.method
+        hasher.method = 'pbkdf2:sha256:1000'
+        try:
+            response = self.app.post('/login', data={
+                'username': 'testuser',
+                'password': 'password123',
+            }, follow_redirects=True)
+            self.assertEqual(response.status_code, 200)
+            with app.app_context():
+                user = User.query.filter_by(username='testuser').first()
+                self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+                self.assertTrue(user.check_password('password123'))
+        finally:
+            hasher.method = method
+
+
+class LastLoginTestCase(BaseTestCase):
+    def test_login_is_read_only(self):
+        """Тест входа без записи в БД"""
+        with count_queries() as statements:
+            self.app.post('/login', data={
+                'username': 'testuser',
+                'password': 'password123',
+            })
+        self.assertFalse([s for s in statements if not s.startswith('SELECT')])
+
+        with app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            self.assertIsNone(user.last_login)
+            self.assertIn(user.id, last_logins.pending())
+
+    def test_flush(self):
+        """Тест пакетной записи времени входа"""
+        with app.app_context():
+            ids = [user.id for user in User.query.order_by(User.id)]
+        now = datetime.datetime.utcnow()
+        last_logins.record(ids[0], now - datetime.timedelta(minutes=1))
+        last_logins.record(ids[0], now)
+        last_logins.record(ids[0], now - datetime.timedelta(minutes=2))
+        last_logins.record(ids[1], now)
+        user_cache.set(ids[0], {'id': ids[0]})
+
+        with count_queries() as statements:
+            self.assertEqual(last_logins.flush(), 2)
+        # Все пользователи записываются одним executemany
+        self.assertEqual(len([s for s in statements if s.startswith('UPDATE')]), 1)
+        self.assertEqual(last_logins.pending(), {})
+        self.assertIsNone(user_cache.get(ids[0]))
+
+        with app.app_context():
+            self.assertEqual(User.query.get(ids[0]).last_login, now)
+
+        # Более старое значение из другого воркера не затирает новое
+        last_logins.record(ids[0], now - datetime.timedelta(hours=1))
+        last_logins.flush()
+        with app.app_context():
+            self.assertEqual(User.query.get(ids[0]).last_login, now)
+
+    def test_failed_flush_keeps_values(self):
+        """Тест повторной записи после ошибки"""
+        def failing_writer(batch):
+            raise RuntimeError('БД недоступна')
+
+        buffer = LastLoginBuffer(failing_writer)
+        now = datetime.datetime.utcnow()
+        buffer.record(1, now)
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        self.assertEqual(buffer.pending(), {1: now})
+        buffer.clear()
+
 
 class CalendarTestCase(BaseTestCase):
     def test_calendar_calculation(self):
@@ -132,6 +282,31 @@ class CalendarTestCase(BaseTestCase):
         # Проверяем, что это выходной день (последние 2 дня цикла)
         self.assertTrue(cycle_position >= 2)
 
+    def test_calendar_conditional_request(self):
+        """Тест ответа 304 на повторный запрос календаря с ETag"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+
+        response = self.app.get('/?month=5&year=2025')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        response = self.app.get('/?month=5&year=2025', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # Слабый ETag (после gzip в nginx) тоже подходит
+        response = self.app.get('/?month=5&year=2025', headers={'If-None-Match': 'W/' + etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.app.get('/?month=6&year=2025', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
     def test_calendar_navigation(self):
         """Тест навигации по календарю"""
         # Входим в систему
@@ -147,6 +322,235 @@ class CalendarTestCase(BaseTestCase):
         self.assertIn(b'2025', response.data)
 
 
+class ScheduleTestCase(unittest.TestCase):
+    def test_range_matches_daily_calculation(self):
+        """Тест совпадения пакетного расчета с расчетом по дням"""
+        start_date = datetime.date(2025, 3, 17)
+        first = datetime.date(2024, 12, 30)
+        statuses = DEFAULT_SCHEDULE.range(first, datetime.date(2026, 2, 3))
+
+        for i, status in enumerate(statuses):
+            current_date = first + datetime.timedelta(days=i)
+            expected = WORK if (current_date - start_date).days % 4 < 2 else OFF
+            self.assertEqual(status, expected)
+
+    def test_months(self):
+        """Тест расчета нескольких месяцев подряд с переходом через год"""
+        months = DEFAULT_SCHEDULE.months(2025, 11, 3)
+        self.assertEqual([(y, m) for y, m, _ in months], [(2025, 11), (2025, 12), (2026, 1)])
+        self.assertEqual([len(days) for _, _, days in months], [30, 31, 31])
+        self.assertEqual(months[2][2], DEFAULT_SCHEDULE.month(2026, 1))
+
+    def test_spans(self):
+        """Тест разбиения диапазона на серии одинаковых статусов"""
+        first = datetime.date(2025, 3, 18)
+        last = datetime.date(2026, 5, 1)
+        for pattern in ('2/2', '5/2', 'DNOO', '3/0'):
+            schedule = Schedule(datetime.date(2025, 3, 17), parse_pattern(pattern))
+            spans = schedule.spans(first, last)
+            expanded = b''.join(bytes((status,)) * length for _, length, status in spans)
+            self.assertEqual(expanded, schedule.range(first, last))
+            for (start, length, status), following in zip(spans, spans[1:]):
+                self.assertEqual(start + datetime.timedelta(days=length), following[0])
+                self.assertNotEqual(status, following[2])
+
+    def test_empty_range(self):
+        """Тест пустого диапазона и пустого цикла"""
+        day = datetime.date(2025, 3, 17)
+        self.assertEqual(DEFAULT_SCHEDULE.range(day, day - datetime.timedelta(days=1)), b'')
+        with self.assertRaises(ValueError):
+            Schedule(day, b'')
+
+
+class RotationTestCase(BaseTestCase):
+    def test_parse_pattern(self):
+        """Тест разбора шаблонов ротации"""
+        self.assertEqual(parse_pattern('2/2'), bytes((WORK, WORK, OFF, OFF)))
+        self.assertEqual(parse_pattern('5/2'), bytes((WORK,) * 5 + (OFF,) * 2))
+        self.assertEqual(parse_pattern('dnoo'), bytes((WORK, NIGHT, OFF, OFF)))
+        for pattern in ('', '4x', '/2', 'DNZ'):
+            with self.assertRaises(ValueError):
+                parse_pattern(pattern)
+
+    def test_rotation_cache(self):
+        """Тест кэша скомпилированных ротаций"""
+        calls = []
+
+        def loader(rotation_id):
+            calls.append(rotation_id)
+            return '4/4', datetime.date(2025, 1, 1)
+
+        cache = RotationCache(loader)
+        self.assertIs(cache.get(None), DEFAULT_SCHEDULE)
+        schedule = cache.get(1)
+        self.assertIs(cache.get(1), schedule)
+        self.assertEqual(calls, [1])
+        self.assertEqual(schedule.period, 8)
+
+        cache.invalidate(1)
+        cache.get(1)
+        self.assertEqual(calls, [1, 1])
+
+    def test_calendar_uses_user_rotation(self):
+        """Тест отображения календаря по ротации пользователя"""
+        with app.app_context():
+            rotation = Rotation(name='crew-n', pattern='DNOO', start_date=datetime.date(2025, 3, 17))
+            db.session.add(rotation)
+            db.session.commit()
+            User.query.filter_by(username='testuser').update({User.rotation_id: rotation.id})
+            db.session.commit()
+
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+
+        response = self.app.get('/?month=3&year=2025')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'night-legend', response.data)
+        self.assertIn(b'<td class="night ">', response.data)
+
+
+class FragmentCacheTestCase(BaseTestCase):
+    def test_lru_eviction_and_counters(self):
+        """Тест вытеснения и счетчиков LRU-кэша"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1, 'evictions': 1})
+
+        cache.rollover(datetime.date(2025, 3, 17))
+        self.assertEqual(len(cache), 0)
+        cache.set('a', 1)
+        cache.rollover(datetime.date(2025, 3, 17))
+        self.assertEqual(len(cache), 1)
+
+    def test_month_tables_are_cached(self):
+        """Тест повторного использования отрисованных месяцев"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+
+        before = self.app.get('/cache_stats').get_json()['month_fragments']
+        first = self.app.get('/?month=5&year=2025')
+        second = self.app.get('/?month=6&year=2025')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+
+        # Май-июль отрисовываются заново, июнь и июль берутся из кэша
+        after = self.app.get('/cache_stats').get_json()['month_fragments']
+        self.assertEqual(after['misses'] - before['misses'], 4)
+        self.assertEqual(after['hits'] - before['hits'], 2)
+
+
+class ScheduleApiTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+
+    def test_compact_spans(self):
+        """Тест компактного ответа API графика за несколько лет"""
+        response = self.app.get('/api/schedule?from=2025-03-18&to=2028-03-17')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(response.data), 300)
+        data = response.get_json()
+        self.assertEqual(data['days'], 1096)
+        self.assertEqual(data['spans'], [[1, 'work'], [2, 'off'], [1, 'work']])
+        self.assertTrue(data['repeat'])
+
+    def test_expanded_spans(self):
+        """Тест развернутых серий графика"""
+        response = self.app.get('/api/schedule?from=2025-03-17&to=2025-03-22&expand=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['spans'], [
+            ['2025-03-17', 2, 'work'],
+            ['2025-03-19', 2, 'off'],
+            ['2025-03-21', 2, 'work']
+        ])
+
+    def test_invalid_range(self):
+        """Тест ошибок в параметрах диапазона"""
+        self.assertEqual(self.app.get('/api/schedule?from=2025-03-17').status_code, 400)
+        self.assertEqual(self.app.get('/api/schedule?from=2025-03-17&to=2025-03-01').status_code, 400)
+        self.assertEqual(self.app.get('/api/schedule?from=2000-01-01&to=2099-01-01&expand=1').status_code, 400)
+
+
+class CalendarFeedTestCase(BaseTestCase):
+    def test_work_blocks_are_single_events(self):
+        """Тест экспорта: одно событие на рабочий блок"""
+        feed = ''.join(iter_calendar(
+            DEFAULT_SCHEDULE, datetime.date(2025, 3, 17), datetime.date(2025, 3, 30),
+            'График', datetime.date(2025, 3, 17)
+        ))
+        self.assertTrue(feed.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(feed.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(feed.count('BEGIN:VEVENT'), 4)
+        self.assertIn('DTSTART;VALUE=DATE:20250317\r\nDTEND;VALUE=DATE:20250319', feed)
+
+    def test_long_lines_folded(self):
+        """Тест складывания длинных строк ленты по 75 октетов"""
+        name = 'График ' + 'Ж' * 60
+        feed = ''.join(iter_calendar(
+            DEFAULT_SCHEDULE, datetime.date(2025, 3, 17), datetime.date(2025, 3, 20),
+            name, datetime.date(2025, 3, 17)
+        ))
+        for line in feed.split('\r\n'):
+            self.assertLessEqual(len(line.encode('utf-8')), 75)
+        unfolded = feed.replace('\r\n ', '')
+        self.assertIn(f'X-WR-CALNAME:{name}\r\n', unfolded)
+
+    def test_uid_stable_when_window_slides(self):
+        """Тест UID события: не меняется, когда окно обрезает начало блока"""
+        def first_uid(first):
+            feed = ''.join(iter_calendar(
+                DEFAULT_SCHEDULE, first, first + datetime.timedelta(days=10),
+                'График', first
+            ))
+            return feed.split('UID:', 1)[1].split('\r\n', 1)[0]
+
+        self.assertEqual(DEFAULT_SCHEDULE.run_start(datetime.date(2025, 3, 18)), datetime.date(2025, 3, 17))
+        self.assertEqual(first_uid(datetime.date(2025, 3, 17)), first_uid(datetime.date(2025, 3, 18)))
+
+    def test_feed_etag(self):
+        """Тест ленты .ics с ETag и ответом 304"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+
+        response = self.app.get('/calendar.ics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/calendar')
+        self.assertIn(b'BEGIN:VEVENT', response.data)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        response = self.app.get('/calendar.ics', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_feed_by_token(self):
+        """Тест подписки на ленту по токену без входа в систему"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        page = self.app.get('/').get_data(as_text=True)
+        feed_url = page.split('href="http://localhost/calendar/', 1)[1].split('"', 1)[0]
+        self.app.get('/logout')
+
+        response = self.app.get('/calendar/' + feed_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-WR-CALNAME:График testuser', response.get_data(as_text=True))
+        self.assertEqual(self.app.get('/calendar/forged.ics').status_code, 404)
+
+
 class MessageTestCase(BaseTestCase):
     def test_send_message(self):
         """Тест отправки сообщения"""
@@ -177,6 +581,836 @@ class MessageTestCase(BaseTestCase):
             ).first()
             self.assertIsNotNone(message)
 
+    def test_send_bulk(self):
+        """Тест отправки МУР нескольким получателям"""
+        with app.app_context():
+            user3 = User(username='testuser3', email='test3@example.com')
+            user3.set_password('password123')
+            db.session.add(user3)
+            db.session.commit()
+            recipients = [u.id for u in User.query.filter(User.username != 'testuser').order_by(User.id)]
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        })
+
+        with count_queries() as statements:
+            response = self.app.post('/send_mur_bulk', data={
+                'recipient_ids': [str(recipients[0]), str(recipients[1]), str(recipients[0]), '9999', 'abc']
+            })
+        data = response.get_json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['sent'], 2)
+        self.assertEqual(data['results'], [
+            {'recipient_id': recipients[0], 'status': 'sent'},
+            {'recipient_id': recipients[1], 'status': 'sent'},
+            {'recipient_id': 9999, 'status': 'not_found'},
+            {'recipient_id': 'abc', 'status': 'invalid'}
+        ])
+        # Проверка получателей и одна вставка для всех сообщений
+        self.assertEqual(len([s for s in statements if s.startswith('INSERT INTO message')]), 1)
+
+        with app.app_context():
+            self.assertEqual(
+                sorted(m.recipient_id for m in Message.query.all()),
+                recipients
+            )
+
+    def test_send_bulk_validation(self):
+        """Тест ошибок массовой отправки"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        })
+        response = self.app.post('/send_mur_bulk', data={})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.app.post('/send_mur_bulk', data={'recipient_ids': ['9999']})
+        self.assertFalse(response.get_json()['success'])
+        with app.app_context():
+            self.assertEqual(Message.query.count(), 0)
+
+    def test_unread_increment_upsert(self):
+        """Тест увеличения счетчиков одной вставкой с обновлением при конфликте"""
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first().id
+            user2 = User.query.filter_by(username='testuser2').first().id
+            db.session.add(UnreadCounter(recipient_id=user1, sender_id=user2, count=2))
+            db.session.commit()
+
+            with count_queries() as statements:
+                UnreadCounter.increment(user2, [user1, user2])
+            db.session.commit()
+            # Без предварительного SELECT: одновременные первые МУР не падают на первичном ключе
+            self.assertEqual(len(statements), 1)
+            self.assertIn('ON CONFLICT', statements[0])
+            self.assertEqual(UnreadCounter.for_recipient(user1), {user2: 3})
+            self.assertEqual(UnreadCounter.for_recipient(user2), {user2: 1})
+
+    def test_unread_counters(self):
+        """Тест счетчиков непрочитанных МУР"""
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first().id
+            user2 = User.query.filter_by(username='testuser2').first().id
+        self.app.post('/login', data={'username': 'testuser2', 'password': 'password123'})
+        self.app.post('/send_mur', data={'recipient_id': user1})
+        self.app.post('/send_mur', data={'recipient_id': user1})
+        self.app.post('/send_mur_bulk', data={'recipient_ids': [str(user1)]})
+        self.app.get('/logout')
+
+        with app.app_context():
+            self.assertEqual(UnreadCounter.for_recipient(user1), {user2: 3})
+            self.assertEqual(UnreadCounter.for_recipient(user2), {})
+
+        self.app.post('/login', data={'username': 'testuser', 'password': 'password123'})
+        with count_queries() as statements:
+            response = self.app.get('/chat')
+        self.assertIn(b'unread-badge">3<', response.data)
+        # Значки читаются из счетчиков, сообщения не пересчитываются
+        self.assertFalse([s for s in statements if 'count(' in s.lower()])
+
+        self.app.get(f'/get_messages/{user2}')
+        with app.app_context():
+            self.assertEqual(UnreadCounter.for_recipient(user1), {})
+            self.assertEqual(UnreadCounter.query.get((user1, user2)).count, 0)
+            UnreadCounter.increment(user2, [user1])
+            db.session.commit()
+
+        response = self.app.post(f'/mark_read/{user2}')
+        self.assertTrue(response.get_json()['success'])
+        with app.app_context():
+            self.assertEqual(UnreadCounter.for_recipient(user1), {})
+
+    def test_get_messages_pagination(self):
+        """Тест постраничной загрузки истории переписки по курсору before"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            sender_id = User.query.filter_by(username='testuser').first().id
+            recipient_id = User.query.filter_by(username='testuser2').first().id
+            timestamp = datetime.datetime(2025, 3, 17, 12, 0)
+            for i in range(5):
+                db.session.add(Message(sender_id=sender_id, recipient_id=recipient_id,
+                                       timestamp=timestamp + datetime.timedelta(minutes=i // 2)))
+            db.session.commit()
+            ids = [message.id for message in Message.query.order_by(Message.id.desc())]
+
+        app.config['MESSAGES_PAGE_SIZE'] = 2
+        try:
+            pages = []
+            url = f'/get_messages/{recipient_id}'
+            while url:
+                response = self.app.get(url)
+                pages.append([message['id'] for message in response.get_json()])
+                before = response.headers.get('X-Next-Before')
+                url = f'/get_messages/{recipient_id}?before={before}' if before else None
+        finally:
+            app.config['MESSAGES_PAGE_SIZE'] = 50
+
+        self.assertEqual(pages, [ids[0:2], ids[2:4], ids[4:5]])
+
+    def test_get_messages_both_directions(self):
+        """Тест страниц переписки из сообщений обоих направлений и плана запроса по индексу"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first().id
+            user2 = User.query.filter_by(username='testuser2').first().id
+            timestamp = datetime.datetime(2025, 3, 17, 12, 0)
+            for i in range(7):
+                sender, recipient = (user1, user2) if i % 3 else (user2, user1)
+                db.session.add(Message(sender_id=sender, recipient_id=recipient,
+                                       timestamp=timestamp + datetime.timedelta(minutes=i // 2)))
+            db.session.commit()
+            ids = [message.id for message in Message.query.order_by(Message.timestamp.desc(), Message.id.desc())]
+
+        app.config['MESSAGES_PAGE_SIZE'] = 3
+        try:
+            with count_queries() as statements:
+                first = self.app.get(f'/get_messages/{user2}')
+            second = self.app.get(f"/get_messages/{user2}?before={first.headers['X-Next-Before']}")
+            third = self.app.get(f"/get_messages/{user2}?before={second.headers['X-Next-Before']}")
+        finally:
+            app.config['MESSAGES_PAGE_SIZE'] = 50
+
+        pages = [[message['id'] for message in response.get_json()] for response in (first, second, third)]
+        self.assertEqual(pages, [ids[0:3], ids[3:6], ids[6:7]])
+
+        # Каждое направление ограничено страницей отдельно, без OR по всей переписке
+        statement = next(s for s in statements if 'UNION ALL' in s)
+        self.assertEqual(statement.count('LIMIT'), 3)
+        self.assertNotIn(' OR ', statement.split('UNION ALL')[0].split('WHERE', 1)[1].split('ORDER BY')[0])
+
+    def test_get_messages_query_count(self):
+        """Тест отсутствия N+1 запросов при загрузке переписки"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first().id
+            user2 = User.query.filter_by(username='testuser2').first().id
+            for i in range(30):
+                sender, recipient = (user1, user2) if i % 2 else (user2, user1)
+                db.session.add(Message(sender_id=sender, recipient_id=recipient))
+            db.session.commit()
+
+        with count_queries() as statements:
+            response = self.app.get(f'/get_messages/{user2}')
+
+        self.assertEqual(len(response.get_json()), 30)
+        self.assertEqual({message['sender'] for message in response.get_json()}, {'testuser', 'testuser2'})
+        # Пользователь сессии берется из кэша: остается запрос страницы вместе с именами отправителей
+        # и сброс счетчика непрочитанных
+        self.assertEqual(len(statements), 2)
+
+
+class RetentionTestCase(BaseTestCase):
+    def add_messages(self, count, age):
+        with app.app_context():
+            user1 = User.query.filter_by(username='testuser').first().id
+            user2 = User.query.filter_by(username='testuser2').first().id
+            start = datetime.datetime.utcnow() - age
+            for i in range(count):
+                db.session.add(Message(
+                    sender_id=user1, recipient_id=user2, timestamp=start + datetime.timedelta(hours=i)
+                ))
+            db.session.commit()
+            return user1, user2, start.date()
+
+    def test_compact_in_batches(self):
+        """Тест сворачивания старых сообщений в дневные счетчики"""
+        user1, user2, start = self.add_messages(30, datetime.timedelta(days=100))
+        self.add_messages(5, datetime.timedelta(days=1))
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=90)
+
+        with app.app_context():
+            batches = []
+            self.assertEqual(compact_messages(cutoff, 7, on_batch=batches.append), 30)
+            self.assertEqual(batches, [7, 14, 21, 28, 30])
+            self.assertEqual(Message.query.count(), 5)
+
+            aggregates = MessageDailyAggregate.query.order_by(MessageDailyAggregate.day).all()
+            self.assertEqual(sum(a.count for a in aggregates), 30)
+            self.assertEqual(aggregates[0].day, start)
+            self.assertEqual({(a.sender_id, a.recipient_id) for a in aggregates}, {(user1, user2)})
+
+        # Повторный запуск досчитывает уже существующие дни
+        self.add_messages(3, datetime.timedelta(days=100))
+        with app.app_context():
+            self.assertEqual(compact_messages(cutoff, 7), 3)
+            self.assertEqual(db.session.query(db.func.sum(MessageDailyAggregate.count)).scalar(), 33)
+            self.assertEqual(compact_messages(cutoff, 7), 0)
+
+    def test_compact_command(self):
+        """Тест команды flask messages compact"""
+        self.add_messages(4, datetime.timedelta(days=100))
+        result = app.test_cli_runner().invoke(args=['messages', 'compact', '--days', '30', '--batch-size', '3'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Сжато сообщений старше 30 дн.: 4', result.output)
+        with app.app_context():
+            self.assertEqual(Message.query.count(), 0)
+
+
+class UserDirectoryTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        with app.app_context():
+            for name in ('anna', 'anton', 'boris', 'andrey'):
+                user = User(username=name, email=f'{name}@example.com', password_hash='x')
+                db.session.add(user)
+            db.session.commit()
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        })
+
+    def test_prefix_search(self):
+        """Тест поиска пользователей по началу имени"""
+        response = self.app.get('/api/users?q=an')
+        data = response.get_json()
+        self.assertEqual([user['username'] for user in data['users']], ['andrey', 'anna', 'anton'])
+        self.assertIsNone(data['next'])
+
+        # Текущий пользователь в справочник не попадает
+        data = self.app.get('/api/users?q=testuser').get_json()
+        self.assertEqual([user['username'] for user in data['users']], ['testuser2'])
+
+    def test_keyset_pagination(self):
+        """Тест постраничной загрузки справочника"""
+        names = []
+        after = None
+        while True:
+            url = '/api/users?limit=2' + (f'&after={after}' if after else '')
+            data = self.app.get(url).get_json()
+            names.extend(user['username'] for user in data['users'])
+            after = data['next']
+            if not after:
+                break
+        self.assertEqual(names, ['andrey', 'anna', 'anton', 'boris', 'testuser2'])
+
+        response = self.app.get('/api/users?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_recent_contacts(self):
+        """Тест недавних собеседников на странице чата"""
+        with app.app_context():
+            ids = dict(User.query.with_entities(User.username, User.id))
+        self.app.post('/send_mur', data={'recipient_id': ids['boris']})
+        self.app.post('/send_mur', data={'recipient_id': ids['anna']})
+        with app.app_context():
+            UnreadCounter.increment(ids['anton'], [ids['testuser']])
+            db.session.commit()
+
+        response = self.app.get('/chat')
+        page = response.data.decode()
+        self.assertLess(page.index('data-username="anton"'), page.index('data-username="anna"'))
+        self.assertLess(page.index('data-username="anna"'), page.index('data-username="boris"'))
+        self.assertNotIn('data-username="andrey"', page)
+
+
+class UserCacheTestCase(BaseTestCase):
+    def login(self):
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            return User.query.filter_by(username='testuser').first().id
+
+    def test_authenticated_request_without_user_query(self):
+        """Тест загрузки пользователя сессии из кэша без SQL"""
+        self.login()
+        self.app.get('/cache_stats')
+
+        with count_queries() as statements:
+            response = self.app.get('/cache_stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, [])
+
+    def test_invalidation_on_update(self):
+        """Тест сброса кэша при смене пароля"""
+        user_id = self.login()
+        self.assertIsNotNone(user_cache.get(user_id))
+
+        with app.app_context():
+            user = User.query.get(user_id)
+            user.set_password('newpassword')
+            db.session.commit()
+        self.assertIsNone(user_cache.get(user_id))
+
+        with count_queries() as statements:
+            self.app.get('/cache_stats')
+        self.assertEqual(len(statements), 1)
+
+    def test_no_credentials_in_cache(self):
+        """Тест, что хеш пароля и email не попадают в кэш пользователя"""
+        user_id = self.login()
+        data = user_cache.get(user_id)
+        self.assertEqual(data['username'], 'testuser')
+        self.assertNotIn('password_hash', data)
+        self.assertNotIn('email', data)
+
+        with app.test_request_context():
+            user = User.from_cache(data)
+            self.assertEqual(user.email, 'test@example.com')
+            self.assertTrue(user.check_password('password123'))
+
+    def test_invalidation_on_logout(self):
+        """Тест сброса кэша при выходе из системы"""
+        user_id = self.login()
+        self.app.get('/logout')
+        self.assertIsNone(user_cache.get(user_id))
+
+
+class SessionTestCase(BaseTestCase):
+    def login(self):
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        })
+        return next(cookie for cookie in self.app.cookie_jar if cookie.name == 'session')
+
+    def test_cookie_holds_only_session_id(self):
+        """Тест хранения данных сессии на сервере"""
+        cookie = self.login()
+        sid = session_interface.get_signer(app).unsign(cookie.value).decode()
+        data, expires = session_interface.store.load(sid)
+        self.assertIn('_user_id', data)
+        self.assertNotIn('_user_id', cookie.value)
+        self.assertLess(len(cookie.value), 100)
+        self.assertGreater(expires, datetime.datetime.utcnow())
+
+        response = self.app.get('/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_forged_cookie_is_rejected(self):
+        """Тест подписи идентификатора сессии"""
+        cookie = self.login()
+        sid = session_interface.get_signer(app).unsign(cookie.value).decode()
+        self.app.set_cookie('localhost', 'session', sid)
+        response = self.app.get('/')
+        self.assertEqual(response.status_code, 302)
+
+    def sid(self):
+        cookie = next(cookie for cookie in self.app.cookie_jar if cookie.name == 'session')
+        return session_interface.get_signer(app).unsign(cookie.value).decode()
+
+    def test_logout_clears_login_state(self):
+        """Тест очистки серверной сессии при выходе из системы"""
+        self.login()
+        sid = self.sid()
+        self.app.get('/logout')
+
+        # Выход выдает новый идентификатор, а запись под старым удаляется
+        self.assertIsNone(session_interface.store.load(sid))
+        new_sid = self.sid()
+        self.assertNotEqual(new_sid, sid)
+        data, _ = session_interface.store.load(new_sid)
+        self.assertNotIn('_user_id', data)
+
+        # Сессия без данных удаляется из хранилища вместе с cookie
+        with self.app.session_transaction() as sess:
+            sess.clear()
+        self.assertIsNone(session_interface.store.load(new_sid))
+
+    def test_session_id_rotated_on_login(self):
+        """Тест защиты от фиксации сессии: cookie, выданная до входа, не получает доступ"""
+        # Анонимная сессия с флеш-сообщением о необходимости войти; ее cookie подсовывается жертве
+        self.app.get('/chat')
+        fixed = next(cookie for cookie in self.app.cookie_jar if cookie.name == 'session').value
+        fixed_sid = session_interface.get_signer(app).unsign(fixed).decode()
+
+        victim = app.test_client()
+        victim.set_cookie('localhost', 'session', fixed)
+        victim.post('/login', data={'username': 'testuser', 'password': 'password123'})
+        victim_cookie = next(cookie for cookie in victim.cookie_jar if cookie.name == 'session').value
+        self.assertNotEqual(victim_cookie, fixed)
+        self.assertIsNone(session_interface.store.load(fixed_sid))
+        self.assertEqual(victim.get('/').status_code, 200)
+
+        attacker = app.test_client()
+        attacker.set_cookie('localhost', 'session', fixed)
+        self.assertEqual(attacker.get('/').status_code, 302)
+
+    def test_batched_sweep(self):
+        """Тест удаления просроченных сессий пачками"""
+        store = MemorySessionStore()
+        interface = ServerSessionInterface(store, sweep_batch=2)
+        now = datetime.datetime.utcnow()
+        for i in range(5):
+            store.save(f'old{i}', '{}', now - datetime.timedelta(minutes=1))
+        store.save('fresh', '{}', now + datetime.timedelta(days=1))
+
+        self.assertEqual(store.sweep(now, 2), 2)
+        self.assertEqual(interface.sweep_all(), 3)
+        self.assertIsNotNone(store.load('fresh'))
+        self.assertIsNone(store.load('old4'))
+
+    def test_sqlalchemy_store(self):
+        """Тест хранения сессий в БД"""
+        store = SQLAlchemySessionStore()
+        now = datetime.datetime.utcnow()
+        with app.app_context():
+            store.save('a', '{"x": 1}', now + datetime.timedelta(days=1))
+            store.save('a', '{"x": 2}', now + datetime.timedelta(days=2))
+            store.save('b', '{}', now - datetime.timedelta(days=1))
+            self.assertEqual(store.load('a'), ('{"x": 2}', now + datetime.timedelta(days=2)))
+
+            self.assertEqual(store.sweep(now, 10), 1)
+            self.assertIsNone(store.load('b'))
+            store.delete('a')
+            self.assertIsNone(store.load('a'))
+
+
+class EngineTestCase(BaseTestCase):
+    def test_sqlite_pragmas(self):
+        """Тест PRAGMA для общего файла SQLite"""
+        self.assertEqual(app.config['DB_PROFILE'], 'sqlite')
+        with app.app_context():
+            connection = db.session.connection()
+            self.assertEqual(connection.exec_driver_sql('PRAGMA synchronous').scalar(), 1)
+            self.assertEqual(
+                connection.exec_driver_sql('PRAGMA busy_timeout').scalar(),
+                app.config['SQLITE_PRAGMAS']['busy_timeout']
+            )
+            if db.engine.url.database not in (None, '', ':memory:'):
+                self.assertEqual(connection.exec_driver_sql('PRAGMA journal_mode').scalar(), 'wal')
+
+    def test_server_profile(self):
+        """Тест параметров пула для серверных БД"""
+        options = Config.ENGINE_PROFILES['server']
+        self.assertTrue(options['pool_pre_ping'])
+        engine = create_engine('sqlite:///' + app.config['DATABASE'], **options)
+        self.assertEqual(engine.pool.size(), options['pool_size'])
+        engine.dispose()
+
+    def test_unknown_profile(self):
+        """Тест ошибки при неизвестном DB_PROFILE"""
+        other = Flask(__name__)
+        other.config.from_object(Config)
+        other.config['DB_PROFILE'] = 'unknown'
+        with self.assertRaises(ValueError):
+            init_engines(other, db)
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Маршрутизация чтения на реплику на двух файлах SQLite"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        primary = os.path.join(self.directory, 'primary.db')
+        replica = os.path.join(self.directory, 'replica.db')
+
+        self.app = Flask(__name__)
+        self.app.config.from_object(Config)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+        self.app.config['SQLALCHEMY_BINDS'] = {'replica': f'sqlite:///{replica}'}
+        self.app.config['REPLICA_READ_YOUR_WRITES'] = 60
+        db.init_app(self.app)
+        init_replica(self.app, db)
+
+        @self.app.route('/users')
+        def users():
+            return ','.join(user.username for user in User.query.order_by(User.username))
+
+        @self.app.route('/users/primary')
+        def primary_then_replica():
+            with read_from_primary(db.session):
+                primary = User.query.count()
+            return f'{primary},{User.query.count()}'
+
+        @self.app.route('/users/<name>', methods=['POST'])
+        def add_user(name):
+            db.session.add(User(username=name, email=f'{name}@example.com'))
+            db.session.commit()
+            # Свою запись видно в том же запросе
+            return ','.join(user.username for user in User.query.order_by(User.username))
+
+        with self.app.app_context():
+            for bind_key in (None, 'replica'):
+                db.metadata.create_all(db.engines[bind_key])
+            # Реплика отстает: на ней есть только старая запись
+            with db.engines['replica'].begin() as conn:
+                conn.execute(User.__table__.insert(), {'username': 'old', 'email': 'old@example.com'})
+            with db.engines[None].begin() as conn:
+                conn.execute(User.__table__.insert(), {'username': 'old', 'email': 'old@example.com'})
+                conn.execute(User.__table__.insert(), {'username': 'new', 'email': 'new@example.com'})
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        # init_app регистрирует пустые метаданные для ключа replica, убираем их для остальных тестов
+        db.metadatas.pop('replica', None)
+        shutil.rmtree(self.directory)
+
+    def test_reads_go_to_replica(self):
+        """Тест чтения с реплики"""
+        self.assertEqual(self.client.get('/users').data, b'old')
+
+    def test_read_your_writes(self):
+        """Тест чтения своих записей с основной БД"""
+        self.assertEqual(self.client.post('/users/mine').data, b'mine,new,old')
+        self.assertEqual(self.client.get('/users').data, b'mine,new,old')
+
+        # Другие клиенты по-прежнему читают с реплики
+        self.assertEqual(self.app.test_client().get('/users').data, b'old')
+
+        with self.client.session_transaction() as sess:
+            sess['read_primary_until'] = 0
+        self.assertEqual(self.client.get('/users').data, b'old')
+
+    def test_read_from_primary_block(self):
+        """Тест чтения с основной БД только внутри блока read_from_primary"""
+        self.assertEqual(self.client.get('/users/primary').data, b'2,1')
+
+    def test_background_code_uses_primary(self):
+        """Тест чтения с основной БД вне запросов"""
+        with self.app.app_context():
+            self.assertEqual(User.query.count(), 2)
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Инструментирование запросов на отдельном приложении с METRICS_ENABLED"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.from_object(Config)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.directory}/metrics.db'
+        self.app.config['METRICS_ENABLED'] = True
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        db.init_app(self.app)
+        init_metrics(self.app, db)
+
+        @self.app.route('/users')
+        def users():
+            names = [user.username for user in User.query.all()]
+            return render_template_string('{% for name in names %}{{ name }};{% endfor %}', names=names)
+
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(username='metrics', email='metrics@example.com'))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_server_timing(self):
+        """Тест заголовка Server-Timing"""
+        response = self.client.get('/users')
+        self.assertEqual(response.data, b'metrics;')
+        timing = response.headers['Server-Timing']
+        self.assertIn('app;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+
+    def test_prometheus_endpoint(self):
+        """Тест счетчиков по эндпоинтам в /metrics"""
+        self.client.get('/users')
+        self.client.get('/users')
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        text = response.data.decode()
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertRegex(text, r'app_requests_total\{endpoint="users",pid="\d+"\} 2')
+        self.assertRegex(text, r'app_sql_queries_total\{endpoint="users",pid="\d+"\} 2')
+        self.assertRegex(text, r'app_request_duration_seconds_bucket\{endpoint="users",pid="\d+",le="\+Inf"\} 2')
+
+    def test_disabled_by_default(self):
+        """Тест отсутствия /metrics без METRICS_ENABLED"""
+        self.assertFalse(app.config['METRICS_ENABLED'])
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
+
+
+class ProfilerTestCase(unittest.TestCase):
+    """Выборочное профилирование на отдельном приложении с PROFILER_ENABLED"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        self.app.config.from_object(Config)
+        self.app.config['PROFILER_ENABLED'] = True
+        self.app.config['PROFILER_TOKEN'] = 'secret'
+        self.app.config['PROFILER_DIR'] = self.directory
+        self.app.config['PROFILER_KEEP'] = 2
+        self.app.config['PROFILER_INTERVAL'] = 0.001
+        self.store = init_profiler(self.app)
+
+        @self.app.route('/slow')
+        def slow():
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                pass
+            return 'ok'
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_profile_with_token(self):
+        """Тест записи collapsed stacks для запроса с токеном"""
+        response = self.client.get('/slow', headers={'X-Profile-Token': 'secret'})
+        self.assertEqual(response.data, b'ok')
+        name = response.headers['X-Profile']
+        self.assertTrue(name.endswith('-slow.folded'))
+
+        with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any('slow (tests.py:' in line for line in lines))
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(int(count) > 0)
+
+    def test_requires_token(self):
+        """Тест, что без верного токена запрос не профилируется"""
+        self.assertNotIn('X-Profile', self.client.get('/slow').headers)
+        self.assertNotIn('X-Profile', self.client.get('/slow?_profile=wrong').headers)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertIn('X-Profile', self.client.get('/slow?_profile=secret').headers)
+
+    def test_ring_buffer(self):
+        """Тест, что хранятся только PROFILER_KEEP последних профилей"""
+        names = [self.client.get('/slow?_profile=secret').headers['X-Profile'] for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(self.directory)), names[1:])
+
+    def test_disabled_by_default(self):
+        """Тест, что без PROFILER_ENABLED обработчики не регистрируются"""
+        self.assertFalse(app.config['PROFILER_ENABLED'])
+        self.assertIsNone(profiles)
+        self.assertNotIn('X-Profile', app.test_client().get('/login?_profile=x').headers)
+
+    def test_token_required(self):
+        """Тест, что профилирование без PROFILER_TOKEN не включается"""
+        other = Flask(__name__)
+        other.config.from_object(Config)
+        other.config['PROFILER_ENABLED'] = True
+        with self.assertRaises(ValueError):
+            init_profiler(other)
+
+
+class AssetsTestCase(unittest.TestCase):
+    """Сборка статики с хешем в именах файлов и asset_url"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(app.static_folder, 'src'), os.path.join(self.directory, 'src'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        """Тест минификации и имен с хешем содержимого"""
+        manifest = build_assets(self.directory)
+        self.assertRegex(manifest['js/chat.js'], r'^dist/js/chat\.[0-9a-f]{8}\.js$')
+        self.assertRegex(manifest['css/auth.css'], r'^dist/css/auth\.[0-9a-f]{8}\.css$')
+        with open(os.path.join(self.directory, 'dist', 'manifest.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f), manifest)
+
+        source = os.path.join(self.directory, 'src', 'css', 'chat.css')
+        built = os.path.join(self.directory, manifest['css/chat.css'])
+        self.assertLess(os.path.getsize(built), os.path.getsize(source))
+
+        # Изменение исходника меняет имя собранного файла
+        with open(source, 'a', encoding='utf-8') as f:
+            f.write('.extra { color: red; }\n')
+        self.assertNotEqual(build_assets(self.directory)['css/chat.css'], manifest['css/chat.css'])
+        self.assertEqual(build_assets(self.directory)['js/chat.js'], manifest['js/chat.js'])
+
+    def test_asset_url(self):
+        """Тест ссылок на собранные файлы и на исходники без сборки"""
+        other = Flask(__name__, static_folder=self.directory, static_url_path='/static')
+        other.config.from_object(Config)
+        init_assets(other)
+        with other.test_request_context():
+            self.assertEqual(render_template_string("{{ asset_url('js/chat.js') }}"), '/static/src/js/chat.js')
+
+        manifest = build_assets(self.directory)
+        other = Flask(__name__, static_folder=self.directory, static_url_path='/static')
+        other.config.from_object(Config)
+        init_assets(other)
+        with other.test_request_context():
+            self.assertEqual(
+                render_template_string("{{ asset_url('js/chat.js') }}"), f"/static/{manifest['js/chat.js']}"
+            )
+        response = other.test_client().get(f"/static/{manifest['js/chat.js']}")
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_pages_use_assets(self):
+        """Тест, что страницы ссылаются на статику, а не встраивают ее"""
+        page = app.test_client().get('/login').get_data(as_text=True)
+        self.assertNotIn('<style>', page)
+        with app.test_request_context():
+            self.assertIn(app.jinja_env.globals['asset_url']('css/auth.css'), page)
+
+    def test_build_version(self):
+        """Тест версии сборки для ETag: меняется вместе со статикой и APP_VERSION"""
+        version = build_version(app, {})
+        self.assertEqual(build_version(app, {}), version)
+        self.assertNotEqual(build_version(app, {'js/chat.js': 'dist/js/chat.0123abcd.js'}), version)
+
+        other = Flask(__name__)
+        other.config.from_object(Config)
+        other.config['APP_VERSION'] = 'next'
+        other.jinja_loader = app.jinja_loader
+        self.assertNotEqual(build_version(other, {}), version)
+
+    def test_templates_prewarmed(self):
+        """Тест компиляции шаблонов при запуске"""
+        cached = {name for _, name in app.jinja_env.cache.keys()}
+        self.assertTrue({'calendar.html', 'chat.html', 'login.html', 'register.html'} <= cached)
+
+
+class PushTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        app.config['SSE_ENABLED'] = True
+
+    def tearDown(self):
+        app.config['SSE_ENABLED'] = False
+        super().tearDown()
+
+    def test_local_broker(self):
+        """Тест локального брокера pub/sub"""
+        local = LocalBroker()
+        subscription = local.subscribe('user:1')
+        local.publish('user:1', {'sender': 'a'})
+        local.publish('user:2', {'sender': 'b'})
+        self.assertEqual(subscription.get(timeout=0.1), {'sender': 'a'})
+        self.assertIsNone(subscription.get(timeout=0.01))
+
+        subscription.close()
+        local.publish('user:1', {'sender': 'c'})
+        self.assertIsNone(subscription.get(timeout=0.01))
+
+    def test_send_publishes_to_recipient(self):
+        """Тест доставки нового сообщения получателю через SSE"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            sender_id = User.query.filter_by(username='testuser').first().id
+            recipient_id = User.query.filter_by(username='testuser2').first().id
+
+        subscription = broker.subscribe(f'user:{recipient_id}')
+        try:
+            self.app.post('/send_mur', data={'recipient_id': recipient_id})
+            message = subscription.get(timeout=1)
+        finally:
+            subscription.close()
+        self.assertEqual(message['sender'], 'testuser')
+        self.assertEqual(message['sender_id'], sender_id)
+
+    def test_stream(self):
+        """Тест потока событий /stream"""
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        with app.app_context():
+            user_id = User.query.filter_by(username='testuser').first().id
+
+        app.config['SSE_MAX_DURATION'] = 0.2
+        try:
+            response = self.app.get('/stream')
+            broker.publish(f'user:{user_id}', {'sender': 'testuser2'})
+            body = response.get_data(as_text=True)
+        finally:
+            app.config['SSE_MAX_DURATION'] = 25
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertIn('event: mur\ndata: {"sender": "testuser2"}\n\n', body)
+
+    def test_push_disabled_under_sync(self):
+        """Тест отключения push при синхронных воркерах"""
+        app.config['SSE_ENABLED'] = False
+        self.assertFalse(Config.SSE_ENABLED)
+        self.app.post('/login', data={
+            'username': 'testuser',
+            'password': 'password123',
+        }, follow_redirects=True)
+        self.assertEqual(self.app.get('/stream').status_code, 204)
+        self.assertIn(b'data-push="0"', self.app.get('/chat').data)
+
+        app.config['SSE_ENABLED'] = True
+        self.assertIn(b'data-push="1"', self.app.get('/chat').data)
+
 
 class ModelTestCase(unittest.TestCase):
     def setUp(self):